@@ -0,0 +1,92 @@
+#  -*- coding: utf-8 -*-
+import os
+import sys
+import dill
+import numpy as np
+from collections.abc import Mapping
+
+"""
+Упакованная база радиозондирования: по одному непрерывному массиву на переменную
+и индекс сеансов (year, month, day, label) -> [start, stop). Массивы открываются
+через np.memmap, поэтому сеанс читается с диска без десериализации всей базы,
+а несколько процессов используют одни и те же страницы файла.
+"""
+
+
+class Archive(Mapping):
+    variables = ('T', 'P', 'rho_rel', 'alt')
+    index_dtype = np.dtype([('year', '<i8'), ('month', '<i8'), ('day', '<i8'), ('label', '<i8'),
+                            ('start', '<i8'), ('stop', '<i8')])
+
+    def __init__(self, path: str = 'radiosonde.packed'):
+        """
+        :param path: каталог упакованной базы (см. Archive.convert)
+        """
+        self.path = path
+        self.index = np.load(os.path.join(path, 'index.npy'))
+        self.arrays = [np.load(os.path.join(path, name + '.npy'), mmap_mode='r') for name in Archive.variables]
+        self.__offsets = {tuple(row[:4]): tuple(row[4:])
+                          for row in self.index.tolist()}
+
+    def __getitem__(self, key: tuple) -> tuple:
+        """
+        :return: T, P, rho_rel, alt - представления (без копирования) данных сеанса
+        """
+        start, stop = self.__offsets[tuple(key)]
+        return tuple(a[start:stop] for a in self.arrays)
+
+    def __iter__(self):
+        return iter(self.__offsets)
+
+    def __len__(self) -> int:
+        return len(self.__offsets)
+
+    def __reduce__(self):
+        # в другой процесс передается только путь, файл отображается заново
+        return Archive, (self.path,)
+
+    @staticmethod
+    def convert(src: str = 'radiosonde.gridded', dst: str = 'radiosonde.packed') -> 'Archive':
+        """
+        Упаковка базы в формате dill ({(year, month, day, label): (T, P, rho_rel, alt)})
+
+        :param src: исходный файл
+        :param dst: каталог упакованной базы
+        """
+        with open(src, 'rb') as dump:
+            data = dill.load(dump)
+        keys = sorted(data.keys())
+        lengths = [len(data[key][0]) for key in keys]
+        stop = np.cumsum(lengths, dtype='<i8')
+
+        index = np.zeros(len(keys), dtype=Archive.index_dtype)
+        for name, column in zip(Archive.index_dtype.names[:4], np.asarray(keys, dtype='<i8').reshape(-1, 4).T):
+            index[name] = column
+        index['start'], index['stop'] = stop - lengths, stop
+
+        if not os.path.exists(dst):
+            os.makedirs(dst)
+        for i, name in enumerate(Archive.variables):
+            a = np.lib.format.open_memmap(os.path.join(dst, name + '.npy'), mode='w+',
+                                          dtype='<f8', shape=(int(stop[-1]) if len(stop) else 0,))
+            for key, start, length in zip(keys, index['start'], lengths):
+                a[start:start + length] = np.asarray(data[key][i], dtype=float)
+            a.flush()
+            del a
+        # индекс записывается последним - по нему определяется готовность базы
+        np.save(os.path.join(dst, 'index.npy'), index)
+        return Archive(dst)
+
+    @staticmethod
+    def is_fresh(src: str = 'radiosonde.gridded', dst: str = 'radiosonde.packed') -> bool:
+        """
+        Упакованная база существует и не старше исходного файла
+        """
+        index = os.path.join(dst, 'index.npy')
+        if not os.path.exists(index):
+            return False
+        return not os.path.exists(src) or os.path.getmtime(index) >= os.path.getmtime(src)
+
+
+if __name__ == '__main__':
+    Archive.convert(*sys.argv[1:3])
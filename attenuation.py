@@ -6,6 +6,47 @@ import numpy as np
 
 dB2np = 0.23255814
 
+# ограничение на объем промежуточных массивов (байт) при пакетном расчете по сетке частот
+max_bytes = 64 * 2 ** 20
+# тип результатов и промежуточных массивов пакетного расчета (np.float32 - вдвое меньше памяти, точность ~1e-6)
+dtype = np.float64
+
+
+def _levels(*args: Union[float, np.ndarray]) -> tuple:
+    """
+    Приведение профилей к общей форме и вытягивание в одномерные массивы уровней
+    """
+    args = np.broadcast_arrays(*[np.asarray(a, dtype=float) for a in args])
+    return (args[0].shape,) + tuple(np.ravel(a) for a in args)
+
+
+# таблицы погонных коэффициентов поглощения {(имя класса, модель): lut.Table}, см. lut.Table.install
+tables = {}
+
+
+def _lookup(cls: type, model: str, frequencies: np.ndarray, T: Union[float, np.ndarray],
+            P: Union[float, np.ndarray], rho: Union[float, np.ndarray]) -> Union[np.ndarray, None]:
+    """
+    Погонный коэффициент поглощения из установленной таблицы или None, если таблицы нет
+    или частоты и уровни вне ее области
+    """
+    if not tables:
+        return None
+    if model not in [m.value for m in cls.Models]:
+        model = cls.Models.P676_13.value
+    table = tables.get((cls.__name__, model))
+    if table is None:
+        return None
+    return table.lookup(frequencies, T, P, rho)
+
+
+def _chunk(n_lines: int, n_levels: int, n_temp: int = 8, itemsize: int = 8) -> int:
+    """
+    Число частот в одной порции, при котором n_temp промежуточных массивов
+    (n_freq, n_lines, n_levels) с элементами по itemsize байт укладываются в max_bytes
+    """
+    return max(1, max_bytes // (itemsize * n_temp * max(1, n_lines) * max(1, n_levels)))
+
 
 class Oxygen:
     class Models(Enum):
@@ -60,6 +101,8 @@ class Oxygen:
             773.839490: [0, 572.300, 0.141, 16.200, 0.0, 0.000, 0.000],
             834.145546: [0, 183.100, 0.145, 14.700, 0.0, 0.000, 0.000],
         }
+        # те же линии в виде непрерывного массива: f_i, a_1, ..., a_6
+        table = np.ascontiguousarray([[f_i] + a[1:] for f_i, a in lines.items()], dtype=float)
 
         @staticmethod
         def __N_d(f: float,
@@ -108,7 +151,98 @@ class Oxygen:
             """
             return dB2np * 0.1820 * frequency * Oxygen.P676_13.__N_oxygen(frequency, T + 273.15, P, rho)
 
+        @staticmethod
+        def __N_oxygen_batch(f: np.ndarray, t: np.ndarray, p: np.ndarray, rho: np.ndarray) -> np.ndarray:
+            e = rho * t / 216.7
+            th = 300 / t
+            _c_1 = p * th * th * th / 10000000
+            _c_2 = 1. - th
+            _c_3 = 1.1 * e * th
+            _c_4 = (p + e) * np.power(th, 0.8) / 10000
+            f_i, a_1, a_2, a_3, a_4, a_5, a_6 = [c[:, np.newaxis] for c in Oxygen.P676_13.table.T]
+            # не зависящие от частоты параметры линий: (n_lines, n_levels)
+            S = a_1 * _c_1 * np.exp(a_2 * _c_2)
+            df = a_3 / 10000 * (p * np.power(th, 0.8 - a_4) + _c_3)
+            df = np.sqrt(df * df + 2.25 / 1000000)
+            delta = (a_5 + a_6 * th) * _c_4
+            d = 5.6 * _c_4
+            # формы линий (n_freq, n_lines, n_levels) считаются в типе dtype
+            f_i, S, df, delta = [np.asarray(a, dtype=dtype) for a in [f_i, S, df, delta]]
+            N = np.empty((len(f), len(t)), dtype=dtype)
+            step = _chunk(len(f_i), len(t), itemsize=N.itemsize)
+            for start in range(0, len(f), step):
+                fc = f[start:start + step, np.newaxis, np.newaxis].astype(dtype)
+                F = fc / f_i * (
+                        (df - delta * (f_i - fc)) / ((f_i - fc) * (f_i - fc) + df * df) +
+                        (df - delta * (f_i + fc)) / ((f_i + fc) * (f_i + fc) + df * df)
+                )
+                N[start:start + step] = np.einsum('kl,fkl->fl', S, F) + \
+                    Oxygen.P676_13.__N_d(fc[:, 0], th, p, d)
+            return N
+
+        @staticmethod
+        def gamma_batch(frequencies: np.ndarray,
+                        T: Union[float, np.ndarray], P: Union[float, np.ndarray],
+                        rho: Union[float, np.ndarray]) -> np.ndarray:
+            """
+            Расчет сразу для сетки частот и всех уровней
+
+            :param frequencies: частоты излучения в ГГц
+            :param T: термодинамическая температура, градусы Цельсия
+            :param P: атмосферное давление, мбар или гПа
+            :param rho: абсолютная влажность, г/м^3
+            :return: погонный коэффициент поглощения в кислороде (нп/км), форма (n_freq, *T.shape)
+            """
+            shape, T, P, rho = _levels(T, P, rho)
+            f = np.ravel(np.asarray(frequencies, dtype=float))
+            N = Oxygen.P676_13.__N_oxygen_batch(f, T + 273.15, P, rho)
+            return ((dB2np * 0.1820 * f[:, np.newaxis]).astype(N.dtype) * N).reshape((len(f),) + shape)
+
     class P676_3:
+        @staticmethod
+        def __low(f: np.ndarray, rp: np.ndarray, rt: np.ndarray) -> np.ndarray:
+            # f <= 57 ГГц, дБ/км
+            return (7.27 * rt / (f * f + 0.351 * rp * rp * rt * rt) +
+                    7.5 / ((f - 57) * (f - 57) + 2.44 * rp * rp * rt * rt * rt * rt * rt)) * \
+                f * f * rp * rp * rt * rt / 1000
+
+        @staticmethod
+        def __high(f: np.ndarray, rp: np.ndarray, rt: np.ndarray) -> np.ndarray:
+            # 63 <= f <= 350 ГГц, дБ/км
+            return (2 / 10000 * np.power(rt, 1.5) * (1 - 1.2 / 100000 * np.power(f, 1.5)) +
+                    4 / ((f - 63) * (f - 63) + 1.5 * rp * rp * rt * rt * rt * rt * rt) +
+                    0.28 * rt * rt / ((f - 118.75) * (f - 118.75) + 2.84 * rp * rp * rt * rt)) * \
+                f * f * rp * rp * rt * rt / 1000
+
+        @staticmethod
+        def gamma_batch(frequencies: np.ndarray,
+                        T: Union[float, np.ndarray], P: Union[float, np.ndarray]) -> np.ndarray:
+            """
+            Расчет сразу для сетки частот и всех уровней
+
+            :param frequencies: частоты излучения в ГГц
+            :param T: термодинамическая температура, градусы Цельсия
+            :param P: атмосферное давление, мбар или гПа
+            :return: погонный коэффициент поглощения в кислороде (нп/км), форма (n_freq, *T.shape)
+            """
+            shape, T, P = _levels(T, P)
+            f = np.ravel(np.asarray(frequencies, dtype=float))[:, np.newaxis]
+            rp = P / 1013
+            rt = 288 / (273 + T)
+            gamma = np.zeros((len(f), len(T)))
+
+            low = f[:, 0] <= 57
+            gamma[low] = Oxygen.P676_3.__low(f[low], rp, rt)
+            high = (63 <= f[:, 0]) & (f[:, 0] <= 350)
+            gamma[high] = Oxygen.P676_3.__high(f[high], rp, rt)
+            mid = (57 < f[:, 0]) & (f[:, 0] < 63)
+            if np.any(mid):
+                fm = f[mid]
+                gamma[mid] = (fm - 60) * (fm - 63) / 18 * Oxygen.P676_3.__low(57., rp, rt) - \
+                    1.66 * rp * rp * np.power(rt, 8.5) * (fm - 57) * (fm - 63) + \
+                    (fm - 57) * (fm - 60) / 18 * Oxygen.P676_3.__high(63., rp, rt)
+            return (dB2np * gamma).reshape((len(f),) + shape)
+
         @staticmethod
         def gamma(frequency: float,
                   T: Union[float, np.ndarray], P: Union[float, np.ndarray]) -> Union[float, np.ndarray]:
@@ -118,66 +252,75 @@ class Oxygen:
             :param P: атмосферное давление, мбар или гПа
             :return: погонный коэффициент поглощения в кислороде (нп/км)
             """
-            rp = P / 1013
-            rt = 288 / (273 + T)
-            f = frequency
-            gamma = 0
-            if f <= 57:
-                gamma = (7.27 * rt / (f * f + 0.351 * rp * rp * rt * rt) +
-                         7.5 / ((f - 57) * (f - 57) + 2.44 * rp * rp * rt * rt * rt * rt * rt)) * \
-                        f * f * rp * rp * rt * rt / 1000
-            elif 63 <= f <= 350:
-                gamma = (2 / 10000 * np.power(rt, 1.5) * (1 - 1.2 / 100000 * np.power(f, 1.5)) +
-                         4 / ((f - 63) * (f - 63) + 1.5 * rp * rp * rt * rt * rt * rt * rt) +
-                         0.28 * rt * rt / ((f - 118.75) * (f - 118.75) + 2.84 * rp * rp * rt * rt)) * \
-                        f * f * rp * rp * rt * rt / 1000
-            elif 57 < f < 63:
-                gamma = (f - 60) * (f - 63) / 18 * Oxygen.P676_3.gamma(57., T, P) - \
-                        1.66 * rp * rp * np.power(rt, 8.5) * (f - 57) * (f - 63) + \
-                        (f - 57) * (f - 60) / 18 * Oxygen.P676_3.gamma(63., T, P)
-            return dB2np * gamma
+            return Oxygen.P676_3.gamma_batch([frequency], T, P)[0]
 
     class Prev:
+        fp = np.asarray([56.26476, 58.44658, 59.59098, 60.43479, 61.15057, 61.80017,
+                         62.41121, 62.99798, 63.56851, 64.12776, 64.67891, 65.22410, 65.76474,
+                         66.30205, 66.83676, 67.36951, 67.90073, 68.43079, 68.96100, 69.48867,
+                         70.01689, 70.54489, 71.07162, 71.59919, 72.12695])
+        fm = np.asarray([118.7503, 62.48625, 60.30603, 59.16420, 58.32388, 57.61249,
+                         56.96817, 56.36339, 55.78381, 55.22136, 54.67114, 54.12996, 53.59567,
+                         53.06679, 52.54222, 52.02116, 51.50300, 50.98729, 50.47359, 49.96179,
+                         49.45138, 48.94240, 48.43611, 47.92955, 47.42391])
+        # параметры линий i = 1..24: (n_lines, 1)
+        m = (2 * np.arange(1, 25) - 1.0)[:, np.newaxis]
+        m0 = 2 * (m * m + m + 1.0) * (2 * m + 1.0) / (m * (m + 1.0))
+        mp = m * (2 * m + 3.0) / (m + 1.0)
+        mm = (m + 1.0) * (2 * m - 1.0) / m
+        fn2 = (fp[1:] * fp[1:])[:, np.newaxis]
+        fn1 = (fm[1:] * fm[1:])[:, np.newaxis]
+
         @staticmethod
-        def gamma(f: float,
-                  T: Union[float, np.ndarray], P: Union[float, np.ndarray]) -> Union[float, np.ndarray]:
-            T += 273.15
-            fp = np.asarray([56.26476, 58.44658, 59.59098, 60.43479, 61.15057, 61.80017,
-                             62.41121, 62.99798, 63.56851, 64.12776, 64.67891, 65.22410, 65.76474,
-                             66.30205, 66.83676, 67.36951, 67.90073, 68.43079, 68.96100, 69.48867,
-                             70.01689, 70.54489, 71.07162, 71.59919, 72.12695])
-            fm = np.asarray([118.7503, 62.48625, 60.30603, 59.16420, 58.32388, 57.61249,
-                             56.96817, 56.36339, 55.78381, 55.22136, 54.67114, 54.12996, 53.59567,
-                             53.06679, 52.54222, 52.02116, 51.50300, 50.98729, 50.47359, 49.96179,
-                             49.45138, 48.94240, 48.43611, 47.92955, 47.42391])
-            ff = f * f
+        def gamma_batch(frequencies: np.ndarray,
+                        T: Union[float, np.ndarray], P: Union[float, np.ndarray]) -> np.ndarray:
+            """
+            Расчет сразу для сетки частот и всех уровней
+
+            :param frequencies: частоты излучения в ГГц
+            :param T: термодинамическая температура, градусы Цельсия
+            :param P: атмосферное давление, мбар или гПа
+            :return: погонный коэффициент поглощения в кислороде (нп/км), форма (n_freq, *T.shape)
+            """
+            shape, T, P = _levels(T, P)
+            T = T + 273.15
+            f = np.ravel(np.asarray(frequencies, dtype=float))
             A = np.where(P <= 25.26, 0.001054,
                          np.where(P <= 331.0, 0.001054-0.1717E-5 * (P-25.26),
                                   0.525E-3
                                   )
                          )
-            df = A * P * np.power((300.0/T), 0.9) + 6.33E-8 * ff * np.power(T, 0.5)
-
-            sn3 = 0.
-            for i in range(1, 25):
-                m = 2*i - 1.0
-                m0 = 2 * (m * m + m + 1.0) * (2 * m + 1.0) / (m * (m + 1.0))
-                mp = m * (2 * m + 3.0) / (m + 1.0)
-                mm = (m + 1.0) * (2 * m - 1.0) / m
+            # не зависящие от частоты множители
+            df_p = A * P * np.power((300.0/T), 0.9)
+            df_f = 6.33E-8 * np.power(T, 0.5)
+            sn1 = np.exp(-2.06858 * Oxygen.Prev.m * (Oxygen.Prev.m + 1.0) / T)
+            c = 0.4517 * P / T / T / T
+
+            ab = np.empty((len(f), len(T)))
+            step = _chunk(len(Oxygen.Prev.m), len(T))
+            for start in range(0, len(f), step):
+                ff = (f[start:start + step] * f[start:start + step])[:, np.newaxis, np.newaxis]
+                df = df_p + df_f * ff
                 fn0 = 0.6 / (ff + 0.36)
-                fn2 = fp[i] * fp[i]
-                fnp = 4.0 * fn2 * df / ((fn2 - ff) * (fn2 - ff) + 4.0 * ff * df * df)
-                fn1 = fm[i] * fm[i]
-                fnm = 4.0 * fn1 * df / ((fn2 - ff) * (fn2 - ff) + 4.0 * ff * df * df)
-                sn1 = np.exp(-2.06858 * m * (m + 1.0) / T)
-                sn2 = (m0 * fn0 + mp * fnp + mm * fnm)
-                sn3 += (sn2 * sn1)
-            ab = 0.4517 * P * ff * sn3 / T / T / T
-            return dB2np * ab
+                den = (Oxygen.Prev.fn2 - ff) * (Oxygen.Prev.fn2 - ff) + 4.0 * ff * df * df
+                fnp = 4.0 * Oxygen.Prev.fn2 * df / den
+                # знаменатель у fnm тот же, что у fnp (как в исходной реализации модели)
+                fnm = 4.0 * Oxygen.Prev.fn1 * df / den
+                sn3 = np.sum((Oxygen.Prev.m0 * fn0 + Oxygen.Prev.mp * fnp + Oxygen.Prev.mm * fnm) * sn1, axis=1)
+                ab[start:start + step] = c * ff[:, 0] * sn3
+            return (dB2np * ab).reshape((len(f),) + shape)
+
+        @staticmethod
+        def gamma(f: float,
+                  T: Union[float, np.ndarray], P: Union[float, np.ndarray]) -> Union[float, np.ndarray]:
+            return Oxygen.Prev.gamma_batch([f], T, P)[0]
 
     @staticmethod
     def gamma(model: str, frequency: float, T: Union[float, np.ndarray], P: Union[float, np.ndarray],
               rho: Union[float, np.ndarray] = None) -> Union[float, np.ndarray]:
+        g = _lookup(Oxygen, model, [frequency], T, P, rho)
+        if g is not None:
+            return g[0]
         if model == Oxygen.Models.P676_13.value:
             return Oxygen.P676_13.gamma(frequency, T, P, rho)
         if model == Oxygen.Models.P676_3.value:
@@ -187,6 +330,23 @@ class Oxygen:
         # default
         return Oxygen.P676_13.gamma(frequency, T, P, rho)
 
+    @staticmethod
+    def gamma_batch(model: str, frequencies: np.ndarray, T: Union[float, np.ndarray], P: Union[float, np.ndarray],
+                    rho: Union[float, np.ndarray] = None) -> np.ndarray:
+        """
+        :return: погонный коэффициент поглощения в кислороде (нп/км), форма (n_freq, *T.shape)
+        """
+        g = _lookup(Oxygen, model, frequencies, T, P, rho)
+        if g is None:
+            if model == Oxygen.Models.P676_3.value:
+                g = Oxygen.P676_3.gamma_batch(frequencies, T, P)
+            elif model == Oxygen.Models.PREV.value:
+                g = Oxygen.Prev.gamma_batch(frequencies, T, P)
+            else:
+                # default
+                g = Oxygen.P676_13.gamma_batch(frequencies, T, P, rho)
+        return np.asarray(g, dtype=dtype)
+
 
 class WaterVapor:
     class Models(Enum):
@@ -232,6 +392,8 @@ class WaterVapor:
             987.926764: [0, 134.6, 0.257, 29.85, 0.68, 4.550, 0.90],
             1780.000000: [0, 17506, 0.952, 196.3, 2.00, 24.15, 5.00],
         }
+        # те же линии в виде непрерывного массива: f_i, b_1, ..., b_6
+        table = np.ascontiguousarray([[f_i] + b[1:] for f_i, b in lines.items()], dtype=float)
 
         @staticmethod
         def __N_water_vapor(f: float,
@@ -270,7 +432,79 @@ class WaterVapor:
             return dB2np * 0.1820 * frequency * \
                 WaterVapor.P676_13.__N_water_vapor(frequency, T + 273.15, P, rho)
 
+        @staticmethod
+        def __N_water_vapor_batch(f: np.ndarray, t: np.ndarray, p: np.ndarray, rho: np.ndarray) -> np.ndarray:
+            e = rho * t / 216.7
+            th = 300 / t
+            _c_1 = e * np.power(th, 3.5) / 10.
+            _c_2 = 1. - th
+            f_i, b_1, b_2, b_3, b_4, b_5, b_6 = [c[:, np.newaxis] for c in WaterVapor.P676_13.table.T]
+            # не зависящие от частоты параметры линий: (n_lines, n_levels)
+            S = b_1 * _c_1 * np.exp(b_2 * _c_2)
+            df = b_3 / 10000 * (p * np.power(th, b_4) + b_5 * e * np.power(th, b_6))
+            df = 0.535 * df + np.sqrt(0.217 * df * df + (2.1316 / 1000000000000 * f_i * f_i) / th)
+            # формы линий (n_freq, n_lines, n_levels) считаются в типе dtype
+            f_i, S, df = [np.asarray(a, dtype=dtype) for a in [f_i, S, df]]
+            N = np.empty((len(f), len(t)), dtype=dtype)
+            step = _chunk(len(f_i), len(t), itemsize=N.itemsize)
+            for start in range(0, len(f), step):
+                fc = f[start:start + step, np.newaxis, np.newaxis].astype(dtype)
+                F = fc / f_i * (
+                        df / ((f_i - fc) * (f_i - fc) + df * df) +
+                        df / ((f_i + fc) * (f_i + fc) + df * df)
+                )
+                N[start:start + step] = np.einsum('kl,fkl->fl', S, F)
+            return N
+
+        @staticmethod
+        def gamma_batch(frequencies: np.ndarray,
+                        T: Union[float, np.ndarray], P: Union[float, np.ndarray],
+                        rho: Union[float, np.ndarray]) -> np.ndarray:
+            """
+            Расчет сразу для сетки частот и всех уровней
+
+            :param frequencies: частоты излучения в ГГц
+            :param T: термодинамическая температура, градусы Цельсия
+            :param P: атмосферное давление, мбар или гПа
+            :param rho: абсолютная влажность, г/м^3
+            :return: погонный коэффициент поглощения в водяном паре (нп/км), форма (n_freq, *T.shape)
+            """
+            shape, T, P, rho = _levels(T, P, rho)
+            f = np.ravel(np.asarray(frequencies, dtype=float))
+            N = WaterVapor.P676_13.__N_water_vapor_batch(f, T + 273.15, P, rho)
+            return ((dB2np * 0.1820 * f[:, np.newaxis]).astype(N.dtype) * N).reshape((len(f),) + shape)
+
     class P676_3:
+        @staticmethod
+        def gamma_batch(frequencies: np.ndarray,
+                        T: Union[float, np.ndarray], P: Union[float, np.ndarray],
+                        rho: Union[float, np.ndarray]) -> np.ndarray:
+            """
+            Расчет сразу для сетки частот и всех уровней
+
+            :param frequencies: частоты излучения в ГГц
+            :param T: термодинамическая температура, градусы Цельсия
+            :param P: атмосферное давление, мбар или гПа
+            :param rho: абсолютная влажность, г/м^3
+            :return: погонный коэффициент поглощения в водяном паре (нп/км), форма (n_freq, *T.shape)
+            """
+            shape, T, P, rho = _levels(T, P, rho)
+            f = np.ravel(np.asarray(frequencies, dtype=float))[:, np.newaxis]
+            rp = P / 1013
+            rt = 288 / (273 + T)
+            gamma = np.zeros((len(f), len(T)))
+
+            band = f[:, 0] <= 350
+            f = f[band]
+            gamma[band] = (3.27 / 100 * rt +
+                           1.67 / 1000 * rho * rt * rt * rt * rt * rt * rt * rt / rp +
+                           7.7 / 10000 * np.power(f, 0.5) +
+                           3.79 / ((f - 22.235) * (f - 22.235) + 9.81 * rp * rp * rt) +
+                           11.73 * rt / ((f - 183.31) * (f - 183.31) + 11.85 * rp * rp * rt) +
+                           4.01 * rt / ((f - 325.153) * (f - 325.153) + 10.44 * rp * rp * rt)) * \
+                f * f * rho * rp * rt / 10000
+            return (dB2np * gamma).reshape((len(band),) + shape)
+
         @staticmethod
         def gamma(frequency: float,
                   T: Union[float, np.ndarray], P: Union[float, np.ndarray],
@@ -282,19 +516,7 @@ class WaterVapor:
             :param rho: абсолютная влажность, г/м^3
             :return: погонный коэффициент поглощения в водяном паре (нп/км)
             """
-            rp = P / 1013
-            rt = 288 / (273 + T)
-            f = frequency
-            gamma = 0
-            if f <= 350:
-                gamma = (3.27 / 100 * rt +
-                         1.67 / 1000 * rho * rt * rt * rt * rt * rt * rt * rt / rp +
-                         7.7 / 10000 * np.power(f, 0.5) +
-                         3.79 / ((f - 22.235) * (f - 22.235) + 9.81 * rp * rp * rt) +
-                         11.73 * rt / ((f - 183.31) * (f - 183.31) + 11.85 * rp * rp * rt) +
-                         4.01 * rt / ((f - 325.153) * (f - 325.153) + 10.44 * rp * rp * rt)) * \
-                        f * f * rho * rp * rt / 10000
-            return dB2np * gamma
+            return WaterVapor.P676_3.gamma_batch([frequency], T, P, rho)[0]
 
     class Prev:
         @staticmethod
@@ -315,9 +537,22 @@ class WaterVapor:
                             (nu + 22.235) * (nu + 22.235) + dnu * dnu)) + \
                 2.55 * 0.001 * (rho * nu * nu * dnu) / np.power(T, 3 / 2)
 
+        @staticmethod
+        def gamma_batch(frequencies: np.ndarray, T: Union[float, np.ndarray], P: Union[float, np.ndarray],
+                        rho: Union[float, np.ndarray]) -> np.ndarray:
+            """
+            :return: погонный коэффициент поглощения в водяном паре (нп/км), форма (n_freq, *T.shape)
+            """
+            shape, T, P, rho = _levels(T, P, rho)
+            nu = np.ravel(np.asarray(frequencies, dtype=float))[:, np.newaxis]
+            return WaterVapor.Prev.gamma(nu, T, P, rho).reshape((len(nu),) + shape)
+
     @staticmethod
     def gamma(model: str, frequency: float, T: Union[float, np.ndarray], P: Union[float, np.ndarray],
               rho: Union[float, np.ndarray]) -> Union[float, np.ndarray]:
+        g = _lookup(WaterVapor, model, [frequency], T, P, rho)
+        if g is not None:
+            return g[0]
         if model == WaterVapor.Models.P676_13.value:
             return WaterVapor.P676_13.gamma(frequency, T, P, rho)
         if model == WaterVapor.Models.P676_3.value:
@@ -326,3 +561,20 @@ class WaterVapor:
             return WaterVapor.Prev.gamma(frequency, T, P, rho)
         # default
         return WaterVapor.P676_13.gamma(frequency, T, P, rho)
+
+    @staticmethod
+    def gamma_batch(model: str, frequencies: np.ndarray, T: Union[float, np.ndarray], P: Union[float, np.ndarray],
+                    rho: Union[float, np.ndarray]) -> np.ndarray:
+        """
+        :return: погонный коэффициент поглощения в водяном паре (нп/км), форма (n_freq, *T.shape)
+        """
+        g = _lookup(WaterVapor, model, frequencies, T, P, rho)
+        if g is None:
+            if model == WaterVapor.Models.P676_3.value:
+                g = WaterVapor.P676_3.gamma_batch(frequencies, T, P, rho)
+            elif model == WaterVapor.Models.PREV.value:
+                g = WaterVapor.Prev.gamma_batch(frequencies, T, P, rho)
+            else:
+                # default
+                g = WaterVapor.P676_13.gamma_batch(frequencies, T, P, rho)
+        return np.asarray(g, dtype=dtype)
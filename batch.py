@@ -0,0 +1,80 @@
+#  -*- coding: utf-8 -*-
+from typing import Mapping
+import numpy as np
+from core import Initialize, Channel, Progress, chunk_size, solve_tasks
+from archive import Archive
+
+"""
+Пакетный расчет спектров яркостной температуры по множеству сеансов радиозондирования
+"""
+
+_data, _config = None, None
+
+
+def _init_worker(data: Mapping, config: dict) -> None:
+    global _data, _config
+    _data, _config = data, config
+
+
+def _stack(data: Mapping, config: dict, keys: list) -> Initialize:
+    return Initialize.stack([Initialize(**config, **dict(zip(Archive.variables, data[key]))) for key in keys])
+
+
+def _solve(task: tuple) -> tuple:
+    indices, keys = task
+    core = _stack(_data, _config, keys)
+    return indices, core.bt_downwelling_batch(core.frequencies).T
+
+
+def levels(data: Mapping, keys: list, h_start: float = 0., h_stop: float = 0., **_) -> np.ndarray:
+    """
+    Число уровней каждого сеанса в слое [h_start, h_stop]
+    """
+    return np.asarray([np.count_nonzero((h_start <= data[key][-1]) & (data[key][-1] <= h_stop))
+                       for key in keys], dtype=int)
+
+
+def spectra(data: Mapping, keys: list = None, n_workers: int = 1, channel: Channel = None, **config) -> tuple:
+    """
+    Спектры яркостной температуры для списка сеансов
+
+    Сеансы с одинаковым числом уровней объединяются (Initialize.stack) и считаются
+    вместе порциями, объем которых ограничен attenuation.max_bytes. Профили передаются
+    в процессы один раз через инициализатор пула (Archive - только путь к файлу).
+
+    :param data: база сеансов {(year, month, day, label): (T, P, rho_rel, alt)} - Archive или dict
+    :param keys: ключи сеансов (по умолчанию - все)
+    :param n_workers: число процессов
+    :param channel: канал для передачи прогресса (см. core.Channel); при precision != 'float64'
+        в канал передается ('deviation', max |Tb - Tb(float64)|) по первой порции
+    :param config: настройки Initialize (модели, метод интегрирования, высоты, частоты, угол...)
+    :return: keys (n_sessions, 4), frequencies (n_freq,), tb (n_sessions, n_freq);
+        для сеансов без уровней в заданном слое - nan
+    """
+    keys = sorted(data.keys()) if keys is None else [tuple(key) for key in keys]
+    template = Initialize(**config)
+    frequencies, itemsize = template.frequencies, np.dtype(template.precision).itemsize
+    n_levels = levels(data, keys, **config)
+
+    tasks = []
+    for n in np.unique(n_levels[n_levels > 0]):
+        group = np.flatnonzero(n_levels == n)
+        size = chunk_size(len(frequencies), n, itemsize)
+        for start in range(0, len(group), size):
+            indices = group[start:start + size]
+            tasks.append((indices, [keys[i] for i in indices]))
+
+    tb = np.full((len(keys), len(frequencies)), np.nan)
+    progress = Progress(total=len(keys), channel=channel)
+
+    for indices, result in solve_tasks(_solve, tasks, _init_worker, (data, config), n_workers):
+        tb[indices] = result
+        progress.update(len(indices))
+    progress.close()
+    if tasks and channel is not None and template.precision != 'float64' and template.precision_check != 0:
+        indices, keys_ = tasks[0]
+        core = _stack(data, config, keys_)
+        channel.put('deviation', core.compare_batch(tb[indices].T, template.precision_check))
+    if channel is not None:
+        channel.put('progress', 100)
+    return np.asarray(keys, dtype=int).reshape(-1, 4), frequencies, tb
@@ -0,0 +1,176 @@
+#  -*- coding: utf-8 -*-
+import sys
+import json
+import time
+import platform
+import argparse
+import multiprocessing
+import numpy as np
+from core import Initialize, Progress
+from attenuation import Oxygen, WaterVapor
+from integration import Integration
+from vapor import absolute_humidity
+
+"""
+Замеры производительности
+
+    python benchmark.py --output results.json
+    python benchmark.py --output new.json --baseline results.json
+
+Для каждого случая записывается лучшее и среднее время одного вызова (с) по нескольким повторам.
+Случаи с числом точек (уровни x частоты) больше --max-points пропускаются, как и расчеты
+по одной частоте на задачу (batch=False) с числом частот больше --max-tasks.
+"""
+
+
+def standard_atmosphere(n_levels: int, h_stop: float = 15.) -> dict:
+    """
+    Синтетический профиль стандартной атмосферы
+
+    :param n_levels: число уровней
+    :param h_stop: верхняя граница, км
+    :return: словарь T (град. Цельс.), P (гПа), rho_rel (%), alt (км)
+    """
+    alt = np.linspace(0., h_stop, n_levels)
+    T = np.where(alt < 11., 15. - 6.5 * alt, -56.5)
+    P = 1013.25 * np.exp(-alt / 7.7)
+    rho_rel = np.clip(80. - 5. * alt, 5., 100.)
+    return dict(T=T, P=P, rho_rel=rho_rel, alt=alt, h_start=0., h_stop=h_stop)
+
+
+def initialize(n_levels: int, n_freq: int = 100, method: str = Integration.Methods.BOOLE.value,
+               nu_start: float = 18., nu_stop: float = 27.2) -> Initialize:
+    """
+    Initialize для стандартной атмосферы с n_freq частотами в [nu_start, nu_stop] (без кэша)
+    """
+    core = Initialize(oxygen_model=Oxygen.Models.P676_13.value,
+                      water_vapor_model=WaterVapor.Models.P676_13.value,
+                      integration_method=method, nu_start=nu_start, nu_stop=nu_stop, nu_step=nu_stop - nu_start,
+                      theta=0., use_cache=False, **standard_atmosphere(n_levels))
+    core.frequencies = np.linspace(nu_start, nu_stop, n_freq)
+    return core
+
+
+def measure(f, min_time: float = 0.2, max_repeat: int = 50) -> dict:
+    """
+    Время одного вызова f(): лучшее и среднее по повторам, общее время повторов - не меньше min_time
+    """
+    times = []
+    while len(times) < max_repeat and (not times or sum(times) < min_time):
+        start = time.perf_counter()
+        f()
+        times.append(time.perf_counter() - start)
+    return dict(best=min(times), mean=float(np.mean(times)), repeat=len(times))
+
+
+def suite(levels: list, freqs: list, workers: list, max_points: float = 5e7, min_time: float = 0.2,
+          max_tasks: int = 1000) -> dict:
+    """
+    Замеры по всем моделям поглощения, методам интегрирования и Initialize.__call__
+
+    :param levels: числа уровней профилей
+    :param freqs: числа точек сетки частот
+    :param workers: числа процессов для Initialize.__call__
+    :param max_points: пропускать случаи, где уровни x частоты больше
+    :param min_time: минимальное суммарное время повторов одного случая, с
+    :param max_tasks: пропускать Initialize.__call__ по одной частоте на задачу (batch=False),
+        если частот больше: каждая задача передает в процесс весь профиль
+    :return: {имя случая: {best, mean, repeat, levels, freqs} или {skipped: True}}
+    """
+    results = {}
+
+    def run(name: str, f, n_levels: int, n_freq: int = 1, n_tasks: int = 0) -> None:
+        if n_levels * n_freq > max_points or n_tasks > max_tasks:
+            results[name] = dict(skipped=True, levels=n_levels, freqs=n_freq)
+            return
+        results[name] = dict(measure(f, min_time), levels=n_levels, freqs=n_freq)
+        print('{:60s} {:12.6f} s'.format(name, results[name]['best']), file=sys.stderr)
+
+    for n_levels in levels:
+        p = standard_atmosphere(n_levels)
+        T, P = p['T'], p['P']
+        rho = absolute_humidity(T, P, p['rho_rel'])
+
+        for cls in [Oxygen, WaterVapor]:
+            for model in cls.Models:
+                run('gamma/{}/{}/levels={}'.format(cls.__name__, model.name, n_levels),
+                    lambda: cls.gamma(model.value, 22.235, T, P, rho), n_levels)
+                for n_freq in freqs:
+                    f = np.linspace(18., 27.2, n_freq)
+                    run('gamma_batch/{}/{}/levels={}/freqs={}'.format(cls.__name__, model.name, n_levels, n_freq),
+                        lambda: cls.gamma_batch(model.value, f, T, P, rho), n_levels, n_freq)
+
+        g = Oxygen.gamma(Oxygen.Models.P676_13.value, 22.235, T, P, rho)
+        dh = np.diff(np.insert(p['alt'], 0, 0.))
+        for method in Integration.Methods:
+            run('integrate/{}/levels={}'.format(method.name, n_levels),
+                lambda: Integration.integrate(method.value, g, 0, n_levels - 1, dh), n_levels)
+            run('cumulative/{}/levels={}'.format(method.name, n_levels),
+                lambda: Integration.cumulative(method.value, g, dh), n_levels)
+            core = initialize(n_levels, method=method.value)
+            run('bt_downwelling/{}/levels={}'.format(method.name, n_levels),
+                lambda: core.bt_downwelling(22.235), n_levels)
+            for n_freq in freqs:
+                core = initialize(n_levels, n_freq, method=method.value)
+                run('bt_downwelling_batch/{}/levels={}/freqs={}'.format(method.name, n_levels, n_freq),
+                    lambda: core.bt_downwelling_batch(core.frequencies), n_levels, n_freq)
+
+        for n_freq in freqs:
+            core = initialize(n_levels, n_freq)
+            for n_workers in workers:
+                for batch in [False, True]:
+                    run('call/workers={}/batch={}/levels={}/freqs={}'.format(n_workers, batch, n_levels, n_freq),
+                        lambda: core(n_workers, batch=batch), n_levels, n_freq, 0 if batch else n_freq)
+    return results
+
+
+def compare(results: dict, baseline: dict, tolerance: float = 0.1) -> list:
+    """
+    Сравнение с сохраненными замерами
+
+    :param tolerance: допустимое относительное замедление
+    :return: список (имя случая, отношение времени к базовому) для случаев с замедлением больше tolerance
+    """
+    regressions = []
+    for name, result in sorted(results.items()):
+        if name not in baseline or 'best' not in result or 'best' not in baseline[name]:
+            continue
+        ratio = result['best'] / baseline[name]['best']
+        print('{:60s} x{:6.2f}{}'.format(name, ratio, '  !' if ratio > 1 + tolerance else ''))
+        if ratio > 1 + tolerance:
+            regressions.append((name, ratio))
+    return regressions
+
+
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(description='Замеры производительности')
+    parser.add_argument('--levels', type=int, nargs='+', default=[50, 500, 5000])
+    parser.add_argument('--freqs', type=int, nargs='+', default=[100, 1000, 10000, 100000])
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 4, 16])
+    parser.add_argument('--max-points', type=float, default=5e7, help='пропускать случаи с уровни x частоты больше')
+    parser.add_argument('--min-time', type=float, default=0.2, help='минимальное время повторов одного случая, с')
+    parser.add_argument('--max-tasks', type=int, default=1000,
+                        help='пропускать расчеты по одной частоте на задачу (batch=False) с числом частот больше')
+    parser.add_argument('--output', help='файл результатов (JSON)')
+    parser.add_argument('--baseline', help='файл базовых результатов (JSON) для сравнения')
+    parser.add_argument('--tolerance', type=float, default=0.1, help='допустимое относительное замедление')
+    args = parser.parse_args(argv)
+
+    Progress.show = False
+    report = dict(meta=dict(python=platform.python_version(), numpy=np.__version__, platform=platform.platform(),
+                            cpu_count=multiprocessing.cpu_count(), time=time.strftime('%Y-%m-%dT%H:%M:%S')),
+                  results=suite(args.levels, args.freqs, args.workers, args.max_points, args.min_time,
+                                args.max_tasks))
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent=1)
+    if args.baseline:
+        with open(args.baseline, 'r') as file:
+            regressions = compare(report['results'], json.load(file)['results'], args.tolerance)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    multiprocessing.freeze_support()
+    sys.exit(main(sys.argv[1:]))
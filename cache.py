@@ -0,0 +1,149 @@
+#  -*- coding: utf-8 -*-
+import os
+import zipfile
+import hashlib
+from typing import Callable, Union
+from collections import OrderedDict
+import numpy as np
+import attenuation
+
+"""
+Кэш погонных коэффициентов поглощения
+"""
+
+
+class Cache:
+    """
+    LRU-кэш результатов gamma_batch с ограничением по объему (байт) и, при заданном path,
+    с сохранением на диск в формате .npz. Ключ - функция, модель, сетка частот и хэш профилей T, P, rho
+    (и тип результата, если он не float64 - см. attenuation.dtype).
+    """
+    __instances = {}
+
+    def __init__(self, max_bytes: int = 256 * 2 ** 20, path: str = None, max_disk_bytes: int = 2 ** 30):
+        """
+        :param max_bytes: объем кэша в памяти, байт
+        :param path: каталог для сохранения на диск (None - только в памяти)
+        :param max_disk_bytes: объем кэша на диске, байт
+        """
+        self.max_bytes, self.path, self.max_disk_bytes = max_bytes, path, max_disk_bytes
+        self.__items = OrderedDict()
+        self.nbytes = 0
+        self.hits, self.misses = 0, 0
+
+    @staticmethod
+    def instance(path: str = None) -> 'Cache':
+        """
+        Общий для процесса кэш с каталогом path
+        """
+        if path not in Cache.__instances:
+            Cache.__instances[path] = Cache(path=path)
+        return Cache.__instances[path]
+
+    @staticmethod
+    def key(name: str, model: str, frequencies: np.ndarray, *arrays: Union[float, np.ndarray]) -> str:
+        h = hashlib.sha1('{}|{}'.format(name, model).encode())
+        for a in (frequencies,) + arrays:
+            if a is None:
+                continue
+            a = np.ascontiguousarray(a, dtype=float)
+            h.update(str(a.shape).encode())
+            h.update(a.tobytes())
+        return h.hexdigest()
+
+    def __file(self, key: str) -> str:
+        return os.path.join(self.path, key + '.npz')
+
+    def get(self, key: str) -> Union[np.ndarray, None]:
+        if key in self.__items:
+            self.__items.move_to_end(key)
+            return self.__items[key]
+        if self.path is not None and os.path.exists(self.__file(key)):
+            try:
+                with np.load(self.__file(key)) as npz:
+                    value = npz['gamma']
+                os.utime(self.__file(key))
+            except (zipfile.BadZipFile, EOFError, ValueError, KeyError):
+                # поврежденный файл удаляется, коэффициенты будут посчитаны заново
+                self.__remove(self.__file(key))
+                return None
+            except OSError:
+                return None
+            self.__remember(key, value)
+            return value
+        return None
+
+    def put(self, key: str, value: np.ndarray) -> None:
+        self.__remember(key, value)
+        if self.path is not None:
+            os.makedirs(self.path, exist_ok=True)
+            # запись во временный файл и переименование: прерванная запись не оставляет неполный .npz
+            temp = '{}.{}.tmp'.format(self.__file(key), os.getpid())
+            try:
+                with open(temp, 'wb') as file:
+                    np.savez(file, gamma=value)
+                os.replace(temp, self.__file(key))
+            except OSError:
+                self.__remove(temp)
+                return
+            self.__evict_disk()
+
+    def __remember(self, key: str, value: np.ndarray) -> None:
+        value.flags.writeable = False
+        if value.nbytes > self.max_bytes:
+            return
+        if key in self.__items:
+            self.nbytes -= self.__items.pop(key).nbytes
+        self.__items[key] = value
+        self.nbytes += value.nbytes
+        while self.nbytes > self.max_bytes:
+            _, old = self.__items.popitem(last=False)
+            self.nbytes -= old.nbytes
+
+    @staticmethod
+    def __remove(path: str) -> None:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def __evict_disk(self) -> None:
+        # файлы могут одновременно удалять другие процессы
+        files = []
+        for name in os.listdir(self.path):
+            if name.endswith('.npz'):
+                try:
+                    stat = os.stat(os.path.join(self.path, name))
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, os.path.join(self.path, name)))
+        files.sort()
+        total = sum(size for _, size, _ in files)
+        for _, size, path in files:
+            if total <= self.max_disk_bytes:
+                break
+            self.__remove(path)
+            total -= size
+
+    def clear(self) -> None:
+        self.__items.clear()
+        self.nbytes = 0
+
+    def __call__(self, gamma: Callable, model: str, frequencies: np.ndarray,
+                 T: Union[float, np.ndarray], P: Union[float, np.ndarray],
+                 rho: Union[float, np.ndarray] = None) -> np.ndarray:
+        """
+        Результат gamma(model, frequencies, T, P, rho) из кэша или с расчетом и сохранением
+        """
+        name = gamma.__qualname__
+        if np.dtype(attenuation.dtype) != np.float64:
+            name += '|' + np.dtype(attenuation.dtype).name
+        key = Cache.key(name, model, frequencies, T, P, rho)
+        value = self.get(key)
+        if value is not None:
+            self.hits += 1
+            return value
+        self.misses += 1
+        value = np.asarray(gamma(model, frequencies, T, P, rho))
+        self.put(key, value)
+        return value
@@ -0,0 +1,183 @@
+#  -*- coding: utf-8 -*-
+import os
+import sys
+import json
+import argparse
+import multiprocessing
+import numpy as np
+
+"""
+Расчет яркостной температуры без графического интерфейса
+
+    python cli.py config.json radiosonde.packed tb.csv --key 2023 1 1 0 --workers 4
+
+Файл настроек (JSON) содержит параметры core.Initialize: oxygen_model, water_vapor_model,
+integration_method (значение или имя элемента перечисления, например "P676_13", "BOOLE"),
+h_start, h_stop, nu_start, nu_stop, nu_step, theta, relic_background, а также, например,
+lookup_tables - список каталогов таблиц поглощения (см. lut.py), precision - "float32"
+для расчета поглощения и пропускания в float32 (отклонение от float64 выводится в stderr).
+
+Источник профиля:
+    - каталог упакованной базы (archive.Archive) или файл базы dill (*.gridded);
+      без --key считаются все сеансы базы (batch.spectra), с --series - временной ряд
+      сеансов из диапазона ключей (series.spectra);
+    - файл .npz с массивами T, P, rho_rel, alt;
+    - файл .csv со столбцами T, P, rho_rel, alt (строка заголовка с именами).
+
+Результат (.npy, .npz или .csv): для одного профиля - частота и яркостная температура
+(при upwelling - еще и восходящего излучения: столбец tb_up);
+для нескольких сеансов - ключи сеансов, частоты и матрица яркостных температур (.npz или .csv).
+"""
+
+variables = ('T', 'P', 'rho_rel', 'alt')
+
+
+class Messages:
+    """
+    Последние сообщения расчета каждого вида (замена core.Channel в текущем процессе)
+    """
+    def __init__(self):
+        self.last = {}
+
+    def put(self, kind: str, value) -> None:
+        self.last[kind] = value
+
+
+def load_config(path: str) -> dict:
+    from attenuation import Oxygen, WaterVapor
+    from integration import Integration
+
+    with open(path, 'r', encoding='utf-8') as file:
+        config = json.load(file)
+    for name, enum in [('oxygen_model', Oxygen.Models), ('water_vapor_model', WaterVapor.Models),
+                       ('integration_method', Integration.Methods)]:
+        if config.get(name) in enum.__members__:
+            config[name] = enum[config[name]].value
+    return config
+
+
+def load_source(path: str):
+    """
+    :return: база сеансов (Mapping) или словарь одного профиля
+    """
+    if os.path.isdir(path):
+        from archive import Archive
+        return Archive(path)
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.npz':
+        with np.load(path) as npz:
+            return {name: npz[name] for name in variables}
+    if ext == '.csv':
+        table = np.genfromtxt(path, delimiter=',', names=True)
+        return {name: np.asarray(table[name], dtype=float) for name in variables}
+    import dill
+    with open(path, 'rb') as dump:
+        return dill.load(dump)
+
+
+def save(path: str, frequencies: np.ndarray, tb: np.ndarray, keys: np.ndarray = None) -> None:
+    """
+    :param tb: для одного профиля - массив (n_freq,) или (n_freq, 2) с восходящим излучением во втором столбце;
+        для нескольких сеансов - (n_sessions, n_freq)
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if keys is None:
+        tb = np.reshape(tb, (len(frequencies), -1))
+        names = ['tb', 'tb_up'][:tb.shape[1]]
+        results = np.column_stack([frequencies, tb])
+        if ext == '.csv':
+            np.savetxt(path, results, delimiter=',', header=','.join(['nu'] + names), comments='')
+        elif ext == '.npz':
+            np.savez(path, frequencies=frequencies, **{name: tb[:, i] for i, name in enumerate(names)})
+        else:
+            np.save(path, results)
+        return
+    if ext == '.csv':
+        header = ','.join(['year', 'month', 'day', 'label'] + ['{:g}'.format(f) for f in frequencies])
+        np.savetxt(path, np.column_stack([keys, tb]), delimiter=',', header=header, comments='',
+                   fmt=['%d'] * 4 + ['%.6f'] * len(frequencies))
+    elif ext == '.npz':
+        np.savez(path, keys=keys, frequencies=frequencies, tb=tb)
+    else:
+        raise ValueError('results for several sessions are saved to .npz or .csv only')
+
+
+def main(argv: list = None) -> None:
+    parser = argparse.ArgumentParser(description='Яркостная температура нисходящего излучения атмосферы')
+    parser.add_argument('config', help='файл настроек (JSON)')
+    parser.add_argument('source', help='база сеансов, .npz или .csv с профилем')
+    parser.add_argument('output', help='файл результата (.npy, .npz, .csv)')
+    parser.add_argument('--key', type=int, nargs=4, action='append', metavar=('YEAR', 'MONTH', 'DAY', 'LABEL'),
+                        help='ключ сеанса (можно несколько); по умолчанию - все сеансы базы')
+    parser.add_argument('--workers', type=int, default=1, help='число процессов')
+    parser.add_argument('--quiet', action='store_true', help='не показывать прогресс')
+    parser.add_argument('--regrid', type=float, metavar='TOLERANCE',
+                        help='прореживание уровней профиля с допустимой ошибкой яркостной температуры, К')
+    parser.add_argument('--profile', action='store_true', help='замеры по этапам расчета (вывод в stderr)')
+    parser.add_argument('--trace', help='файл JSON для событий замеров в формате Chrome trace')
+    parser.add_argument('--channels', help='описание каналов радиометра (JSON, см. instrument.py): '
+                                           'результат - яркостная температура в каналах')
+    parser.add_argument('--series', type=int, nargs=8, metavar='KEY',
+                        help='временной ряд по сеансам от первого до последнего ключа (year month day label - дважды) '
+                             'с пересчетом только изменившихся уровней')
+    args = parser.parse_args(argv)
+    if args.series is not None and args.workers > 1:
+        parser.error('--series is computed sequentially and does not support --workers')
+
+    import core
+    core.Progress.show = not args.quiet
+
+    config = load_config(args.config)
+    source = load_source(args.source)
+
+    profile = None
+    if all(name in source for name in variables):
+        profile = {name: source[name] for name in variables}
+    elif args.key is not None and len(args.key) == 1:
+        profile = dict(zip(variables, source[tuple(args.key[0])]))
+
+    if profile is not None:
+        instance = core.Initialize(**config, **profile)
+        if args.regrid is not None:
+            n_levels = len(instance.T)
+            instance, error = instance.regrid(args.regrid)
+            print('levels: {} -> {}, max Tb error: {:.4f} K'.format(n_levels, len(instance.T), error),
+                  file=sys.stderr)
+        if args.channels is not None:
+            import instrument
+            bands = instrument.Band.load(args.channels)
+            tb = instrument.brightness(instance, bands, args.workers)
+            save(args.output, np.asarray([band.centre for band in bands]), tb)
+            return
+        results = instance(args.workers, profile=args.profile, trace=args.trace)
+        save(args.output, results[:, 0], results[:, 1:])
+        if instance.deviation is not None:
+            print('precision: {}, max Tb deviation from float64: {:.2e} K'.format(instance.precision,
+                                                                                  instance.deviation),
+                  file=sys.stderr)
+        if instance.report is not None:
+            for name, stage in instance.report.items():
+                print('{:24s} {count:8d} {wall:12.6f} s {cpu:12.6f} s {bytes:12d} B'.format(name, **stage),
+                      file=sys.stderr)
+        return
+
+    if args.series is not None:
+        import series
+        keys, frequencies, tb, _ = series.spectra(source, first=tuple(args.series[:4]), last=tuple(args.series[4:]),
+                                                  **config)
+        save(args.output, frequencies, tb, keys)
+        return
+
+    import batch
+    messages = Messages()
+    keys, frequencies, tb = batch.spectra(source, keys=args.key, n_workers=args.workers, channel=messages, **config)
+    save(args.output, frequencies, tb, keys)
+    if 'deviation' in messages.last:
+        print('precision: {}, max Tb deviation from float64: {:.2e} K'.format(config.get('precision'),
+                                                                              messages.last['deviation']),
+              file=sys.stderr)
+
+
+if __name__ == '__main__':
+    multiprocessing.freeze_support()
+    main(sys.argv[1:])
@@ -1,33 +1,308 @@
 #  -*- coding: utf-8 -*-
 import os
-import dill
+import time
+import copy
+import queue
+import pickle
+import warnings
+import contextlib
 import numpy as np
 import attenuation
+import lut
+import profiling
 from integration import Integration, at
 from vapor import absolute_humidity
-from multiprocessing import Pool
-from tqdm import tqdm
+from cache import Cache
+from typing import Callable, Iterator
+from multiprocessing import Pool, Queue, Value, shared_memory, resource_tracker
 
 
-class Tqdm(tqdm):
-    def __init__(self, *args, **kwargs):
-        self.k = 0
-        super().__init__(*args, **kwargs)
+class Channel:
+    """
+    Канал сообщений от расчета к интерфейсу: ('progress', проценты), ('results', массив),
+    ('deviation', max |Tb - Tb(float64)|) - при precision != 'float64'
+    """
+    def __init__(self):
+        self.__queue = Queue()
 
-    @property
-    def n(self):
-        return self.__n
+    def put(self, kind: str, value) -> None:
+        self.__queue.put((kind, value))
 
-    @n.setter
-    def n(self, value):
-        self.__n = value
-        percent = int(value / self.total * 100.)
+    def get(self) -> list:
+        """
+        :return: все накопившиеся сообщения (без ожидания)
+        """
+        messages = []
+        while True:
+            try:
+                messages.append(self.__queue.get_nowait())
+            except queue.Empty:
+                return messages
+
+
+class Progress:
+    """
+    Счетчик прогресса: проценты передаются в канал, при Progress.show - полоса tqdm (если установлен)
+    """
+    show = True
+
+    def __init__(self, total: int, channel: Channel = None):
+        self.total, self.channel = total, channel
+        self.n, self.percent = 0, -1
+        self.bar = None
+        if Progress.show:
+            try:
+                from tqdm import tqdm
+                self.bar = tqdm(total=total)
+            except ImportError:
+                pass
+
+    def update(self, n: int = 1) -> None:
+        self.n += n
+        if self.bar is not None:
+            self.bar.update(n)
+        percent = int(self.n / self.total * 100.)
         if percent >= 100:
             percent = 99
-        if self.k % 10 == 0:
-            with open(os.path.join('.tmp', 'progress'), 'wb') as file:
-                dill.dump(percent, file)
-        self.k += 1
+        if self.channel is not None and percent != self.percent:
+            self.channel.put('progress', percent)
+        self.percent = percent
+
+    def close(self) -> None:
+        if self.bar is not None:
+            self.bar.close()
+
+
+class Writer:
+    """
+    Результаты расчета по позициям частот: массив в памяти или, при заданном path, файл .npy,
+    отображаемый в память. Порции записываются сразу по мере готовности, без сортировки;
+    незаписанные строки заполнены nan, поэтому прерванный расчет с тем же ключом продолжается
+    только для них (см. pending).
+    """
+    def __init__(self, frequencies: np.ndarray, n_columns: int = 2, path: str = None, key: str = None):
+        """
+        :param frequencies: частоты в ГГц
+        :param n_columns: число столбцов результата (частота и яркостные температуры)
+        :param path: файл .npy (None - только в памяти)
+        :param key: ключ расчета (см. Initialize.digest); файл с другим ключом или формой перезаписывается
+        """
+        self.path = path
+        shape = (len(frequencies), n_columns)
+        if path is None:
+            self.results = np.full(shape, np.nan)
+            return
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        try:
+            with open(path + '.key', 'r') as file:
+                same = file.read() == str(key)
+            results = np.load(path, mmap_mode='r+')
+            same = same and results.shape == shape and results.dtype == np.float64
+        except (OSError, ValueError):
+            same = False
+        if same:
+            self.results = results
+            return
+        self.results = np.lib.format.open_memmap(path, mode='w+', dtype='<f8', shape=shape)
+        self.results[:] = np.nan
+        self.results.flush()
+        with open(path + '.key', 'w') as file:
+            file.write(str(key))
+
+    def pending(self) -> np.ndarray:
+        """
+        :return: номера еще не записанных частот
+        """
+        return np.flatnonzero(np.any(np.isnan(self.results), axis=1))
+
+    def write(self, indices: np.ndarray, result: np.ndarray) -> None:
+        self.results[indices] = result
+        if self.path is not None:
+            self.results.flush()
+
+
+def chunk_size(n_freq: int, n_levels: int, itemsize: int = 8, max_bytes: int = None) -> int:
+    """
+    Число профилей в порции, при котором промежуточные массивы (n_freq, n_profiles, n_levels)
+    укладываются в max_bytes (по умолчанию attenuation.max_bytes)
+
+    :param itemsize: размер элемента промежуточных массивов, байт (4 - при precision = 'float32')
+    """
+    if max_bytes is None:
+        max_bytes = attenuation.max_bytes
+    return max(1, max_bytes // (8 * itemsize * max(1, n_freq) * max(1, n_levels)))
+
+
+def solve_tasks(solve: Callable, tasks: list, initializer: Callable, initargs: tuple,
+                n_workers: int = 1) -> Iterator:
+    """
+    Результаты solve(task) по мере готовности
+
+    Задачи решаются в текущем процессе (n_workers <= 1) или в пуле из n_workers процессов;
+    общие данные передаются в процессы один раз через initializer(*initargs). Если замеры
+    включены (profiling.start), замеры процессов пула добавляются к замерам основного процесса.
+    """
+    if n_workers <= 1:
+        initializer(*initargs)
+        yield from map(solve, tasks)
+        return
+    with Pool(processes=n_workers, initializer=_init_tasks,
+              initargs=(initializer, initargs, profiling.settings())) as pool:
+        for result, report in pool.imap_unordered(_solve_task, [(solve, task) for task in tasks]):
+            profiling.merge(report)
+            yield result
+
+
+def _init_tasks(initializer: Callable, initargs: tuple, settings: tuple) -> None:
+    profiling.configure(settings)
+    initializer(*initargs)
+
+
+def _solve_task(task: tuple) -> tuple:
+    solve, task = task
+    return solve(task), profiling.collect()
+
+
+_instance = None
+
+
+def _init_worker(instance: 'Initialize', settings: tuple = (False, False)) -> None:
+    """
+    Инициализатор процесса пула: профиль передается в процесс один раз
+    """
+    global _instance
+    _instance = instance
+    profiling.configure(settings)
+
+
+def _bt_chunk(task: tuple) -> tuple:
+    indices, frequencies = task
+    with profiling.stage('worker'):
+        result = _instance.bt_chunk(frequencies)
+    return indices, result, profiling.collect()
+
+
+def _bt_downwelling(task: tuple) -> tuple:
+    instance, nu, settings = task
+    profiling.configure(settings)
+    with profiling.stage('worker'):
+        result = instance.bt_downwelling(nu)
+    return result, profiling.collect()
+
+
+_current = None
+# профиль текущего расчета в процессе Executor: (номер расчета, Initialize)
+_broadcast = (None, None)
+
+
+def _init_executor(current) -> None:
+    """
+    Инициализатор процессов Executor: номер текущего расчета и предварительная загрузка моделей поглощения
+    """
+    global _current
+    _current = current
+    for model in attenuation.Oxygen.Models:
+        attenuation.Oxygen.gamma_batch(model.value, [22.235], 15., 1013.25, 7.5)
+    for model in attenuation.WaterVapor.Models:
+        attenuation.WaterVapor.gamma_batch(model.value, [22.235], 15., 1013.25, 7.5)
+
+
+def _run_chunk(task: tuple) -> tuple:
+    global _broadcast
+    run, name, size, indices, frequencies, settings = task
+    # задачи отмененного или уже завершенного расчета пропускаются
+    if _current.value != run:
+        return indices, None, None
+    if _broadcast[0] != run:
+        # профиль читается из общей памяти один раз за расчет
+        try:
+            block = shared_memory.SharedMemory(name=name)
+        except FileNotFoundError:
+            return indices, None, None
+        try:
+            _broadcast = (run, pickle.loads(bytes(block.buf[:size])))
+        finally:
+            block.close()
+    profiling.configure(settings)
+    with profiling.stage('worker'):
+        result = _broadcast[1].bt_chunk(frequencies)
+    return indices, result, profiling.collect()
+
+
+class Executor:
+    """
+    Долгоживущий пул процессов, общий для последовательных расчетов
+    """
+    def __init__(self, n_workers: int = None):
+        """
+        :param n_workers: число процессов (по умолчанию - число процессоров)
+        """
+        self.n_workers = n_workers or os.cpu_count()
+        self.__current = Value('i', 0)
+        self.__pool = None
+
+    def start(self) -> None:
+        """
+        Запуск процессов (иначе - при первом расчете)
+        """
+        if self.__pool is None:
+            # процессы пула пользуются тем же учетом общей памяти, что и основной процесс,
+            # и не удаляют общую память расчета (см. run) при своем завершении
+            resource_tracker.ensure_running()
+            self.__pool = Pool(processes=self.n_workers, initializer=_init_executor, initargs=(self.__current,))
+
+    def cancel(self) -> None:
+        """
+        Отмена текущего расчета: оставшиеся задачи пропускаются процессами, run возвращает None
+        """
+        with self.__current.get_lock():
+            self.__current.value += 1
+
+    def close(self) -> None:
+        self.cancel()
+        if self.__pool is not None:
+            self.__pool.terminate()
+            self.__pool.join()
+            self.__pool = None
+
+    def run(self, instance: 'Initialize', chunks: list, writer: Writer, channel: Channel = None) -> bool:
+        """
+        Расчет instance порциями частот с записью в writer
+
+        Профиль передается один раз за расчет: он записывается в общую память, задачи содержат
+        только ее имя и номер расчета, а процесс читает профиль при первой задаче расчета.
+
+        :param chunks: номера частот порций
+        :return: False, если расчет отменен
+        """
+        self.start()
+        with self.__current.get_lock():
+            self.__current.value += 1
+            run = self.__current.value
+
+        data = pickle.dumps(instance, protocol=pickle.HIGHEST_PROTOCOL)
+        block = shared_memory.SharedMemory(create=True, size=max(1, len(data)))
+        block.buf[:len(data)] = data
+        try:
+            tasks = [(run, block.name, len(data), indices, instance.frequencies[indices], profiling.settings())
+                     for indices in chunks]
+            profiling.count('ipc/broadcast', 1, len(data))
+            profiling.count('ipc/tasks', len(tasks), sum(map(profiling.nbytes, tasks)))
+            progress = Progress(total=max(1, sum(map(len, chunks))), channel=channel)
+            for indices, result, report in self.__pool.imap_unordered(_run_chunk, tasks):
+                if self.__current.value != run or result is None:
+                    progress.close()
+                    return False
+                profiling.merge(report)
+                profiling.count('ipc/results', 1, profiling.nbytes(result))
+                Initialize.deliver(writer, indices, result, progress, channel)
+            progress.close()
+            return True
+        finally:
+            block.close()
+            block.unlink()
 
 
 class Initialize:
@@ -40,56 +315,614 @@ class Initialize:
         self.relic_background = True
         self.T, self.P, self.rho_rel, self.alt = [np.array([])] * 4
         self.rho = np.array([])
+        self.use_cache, self.cache_path = True, None
+        self.upwelling = False
+        self.emissivity = 1.
+        self.surface_temperature = None
+        self.lookup_tables = ()
+        self.report = None
+        # 'float32' - поглощение и пропускание в float32 (оптическая толщина накапливается в float64),
+        # по precision_check частотам (0 - без проверки, None - по всем) - сравнение с float64 (deviation)
+        self.precision = 'float64'
+        self.precision_check = 32
+        self.deviation = None
+        # интервалы adaptive, ошибка на которых осталась больше tolerance при наименьшем шаге
+        self.unresolved = None
 
         for name, val in kwargs.items():
             self.__setattr__(name, val)
 
         cond = (self.h_start <= self.alt) & (self.alt <= self.h_stop)
         self.T, self.P, self.rho_rel, self.alt = map(lambda _: _[cond], [self.T, self.P, self.rho_rel, self.alt])
-        self.rho = absolute_humidity(self.T, self.P, self.rho_rel)
+        wall, cpu = time.perf_counter(), time.process_time()
+        with profiling.stage('humidity'):
+            self.rho = absolute_humidity(self.T, self.P, self.rho_rel)
+        # замеры обычно включаются уже после создания (__call__): время пересчета добавляется в отчет там
+        self.__humidity = time.perf_counter() - wall, time.process_time() - cpu
         self.dh = np.diff(np.insert(self.alt, 0, self.h_start))
         self.sec = 1. / np.cos(self.theta * np.pi / 180.)
         self.frequencies = np.arange(self.nu_start, self.nu_stop + self.nu_step, self.nu_step)
 
     def bt_downwelling(self, nu: float):
 
-        g = self.sec * (attenuation.Oxygen.gamma(model=self.oxygen_model,
-                                                 frequency=nu,
-                                                 T=self.T, P=self.P, rho=self.rho) +
-                        attenuation.WaterVapor.gamma(model=self.water_vapor_model,
-                                                     frequency=nu,
-                                                     T=self.T, P=self.P, rho=self.rho))
+        with self.__tables():
+            with profiling.stage('absorption/oxygen'):
+                oxygen = attenuation.Oxygen.gamma(model=self.oxygen_model, frequency=nu,
+                                                  T=self.T, P=self.P, rho=self.rho)
+            with profiling.stage('absorption/water_vapor'):
+                water_vapor = attenuation.WaterVapor.gamma(model=self.water_vapor_model, frequency=nu,
+                                                           T=self.T, P=self.P, rho=self.rho)
+        g = self.sec * (oxygen + water_vapor)
         T = self.T + 273.15
 
-        def f(h):
-            integral = Integration.integrate(method=self.integration_method, a=g, lower=0, upper=h, dh=self.dh)
-            return at(T, h) * at(g, h) * np.exp(-1 * integral)
-
+        with profiling.stage('cumulative'):
+            tau = Integration.cumulative(method=self.integration_method, a=g, dh=self.dh)
         inf = len(g) - 1
-        brt = Integration.integrate_callable(method=self.integration_method, f=f, lower=0, upper=inf, dh=self.dh)
+        with profiling.stage('integrate'):
+            brt = Integration.integrate(method=self.integration_method, a=T * g * np.exp(-1 * tau),
+                                        lower=0, upper=inf, dh=self.dh)
 
         background = 0.
         if self.relic_background:
-            tau = Integration.integrate(method=self.integration_method, a=g, lower=0, upper=inf, dh=self.dh)
-            background = 2.72548 * np.exp(-1 * tau)
+            background = 2.72548 * np.exp(-1 * at(tau, inf))
 
         return nu, brt + background
 
-    def __call__(self, n_workers: int = 1):
-        if not os.path.exists('.tmp'):
-            os.makedirs('.tmp')
+    @staticmethod
+    def stack(instances: list) -> 'Initialize':
+        """
+        Объединение профилей с одинаковым числом уровней в один расчет
+
+        :param instances: список Initialize с одинаковыми настройками
+        :return: Initialize, у которого T, P, rho_rel, alt, rho, dh имеют форму (n_profiles, n_levels)
+        """
+        stacked = copy.copy(instances[0])
+        for name in ['T', 'P', 'rho_rel', 'alt', 'rho', 'dh']:
+            stacked.__setattr__(name, np.stack([_.__getattribute__(name) for _ in instances]))
+        return stacked
+
+    @contextlib.contextmanager
+    def __tables(self):
+        # таблицы lookup_tables - в attenuation.tables только на время расчета
+        tables = attenuation.tables
+        if self.lookup_tables:
+            attenuation.tables = {**tables, **lut.load(self.lookup_tables)}
+        try:
+            yield
+        finally:
+            attenuation.tables = tables
+
+    def absorption(self, frequencies: np.ndarray) -> np.ndarray:
+        """
+        Погонный коэффициент поглощения (в зенит) для сетки частот
+
+        Коэффициенты не зависят от угла и берутся из кэша (use_cache, cache_path - см. cache.Cache).
+        При заданных lookup_tables (каталоги lut.Table) коэффициенты интерполируются по таблицам,
+        кэш при этом не используется.
+
+        :param frequencies: частоты в ГГц
+        :return: массив (n_freq, *T.shape) типа precision
+        """
+        dtype, attenuation.dtype = attenuation.dtype, np.dtype(self.precision).type
+        try:
+            with self.__tables():
+                use_cache = self.use_cache and not attenuation.tables
+                gamma = Cache.instance(self.cache_path) if use_cache else lambda f, *args: f(*args)
+                with profiling.stage('absorption/oxygen'):
+                    oxygen = gamma(attenuation.Oxygen.gamma_batch, self.oxygen_model,
+                                   frequencies, self.T, self.P, self.rho)
+                with profiling.stage('absorption/water_vapor'):
+                    water_vapor = gamma(attenuation.WaterVapor.gamma_batch, self.water_vapor_model,
+                                        frequencies, self.T, self.P, self.rho)
+        finally:
+            attenuation.dtype = dtype
+        return oxygen + water_vapor
+
+    def gamma(self, frequencies: np.ndarray) -> np.ndarray:
+        """
+        Погонный коэффициент поглощения вдоль луча для сетки частот
+
+        :param frequencies: частоты в ГГц
+        :return: массив (n_freq, *T.shape)
+        """
+        a = self.absorption(frequencies)
+        return a.dtype.type(self.sec) * a
+
+    def bt_downwelling_batch(self, frequencies: np.ndarray) -> np.ndarray:
+        """
+        Яркостная температура нисходящего излучения сразу для сетки частот
+
+        :param frequencies: частоты в ГГц
+        :return: массив (n_freq,) или (n_freq, n_profiles) для объединенных профилей (см. stack)
+        """
+        return self.brightness(self.gamma(frequencies))
+
+    def brightness(self, g: np.ndarray) -> np.ndarray:
+        """
+        Яркостная температура нисходящего излучения по готовому погонному коэффициенту поглощения вдоль луча
+
+        :param g: массив (n_freq, *T.shape), см. gamma
+        :return: массив (n_freq,) или (n_freq, n_profiles)
+        """
+        T = (self.T + 273.15).astype(g.dtype)
+
+        with profiling.stage('cumulative'):
+            # g * dh - в float64 при любом типе g
+            tau = Integration.cumulative(method=self.integration_method, a=g, dh=self.dh)
+        inf = np.shape(g)[-1] - 1
+        with profiling.stage('integrate'):
+            brt = Integration.integrate(method=self.integration_method, a=T * g * np.exp(-1 * tau.astype(g.dtype)),
+                                        lower=0, upper=inf, dh=self.dh)
+
+        background = 0.
+        if self.relic_background:
+            background = 2.72548 * np.exp(-1 * at(tau, inf))
+
+        return brt + background
+
+    def bt_batch(self, frequencies: np.ndarray) -> tuple:
+        """
+        Яркостная температура нисходящего (у поверхности) и восходящего (на верхней границе) излучения
+
+        Оба направления считаются по одному профилю поглощения и одной накопленной оптической толщине.
+        Восходящее излучение включает излучение поверхности (emissivity, surface_temperature - град. Цельс.,
+        по умолчанию температура нижнего уровня) и отраженное от нее нисходящее излучение.
+
+        :param frequencies: частоты в ГГц
+        :return: downwelling (n_freq,), upwelling (n_freq,)
+        """
+        g = self.gamma(frequencies)
+        T = (self.T + 273.15).astype(g.dtype)
+
+        with profiling.stage('cumulative'):
+            tau = Integration.cumulative(method=self.integration_method, a=g, dh=self.dh)
+        inf = np.shape(g)[-1] - 1
+        total = at(tau, inf)
+        with profiling.stage('integrate'):
+            down = Integration.integrate(method=self.integration_method, a=T * g * np.exp(-1 * tau.astype(g.dtype)),
+                                         lower=0, upper=inf, dh=self.dh)
+            # оптическая толщина от уровня до верхней границы: total - tau
+            up = Integration.integrate(method=self.integration_method,
+                                       a=T * g * np.exp(-1 * (total[..., np.newaxis] - tau).astype(g.dtype)),
+                                       lower=0, upper=inf, dh=self.dh)
+
+        if self.relic_background:
+            down = down + 2.72548 * np.exp(-1 * total)
+
+        Ts = at(self.T + 273.15, 0) if self.surface_temperature is None else self.surface_temperature + 273.15
+        surface = self.emissivity * Ts + (1. - self.emissivity) * down
+        return down, up + surface * np.exp(-1 * total)
+
+    def bt_chunk(self, frequencies: np.ndarray) -> np.ndarray:
+        """
+        :return: массив (n_freq, 2): частота, яркостная температура нисходящего излучения;
+            при upwelling - (n_freq, 3) с яркостной температурой восходящего излучения в последнем столбце
+        """
+        if self.upwelling:
+            return np.stack([frequencies, *self.bt_batch(frequencies)], axis=1)
+        return np.stack([frequencies, self.bt_downwelling_batch(frequencies)], axis=1)
+
+    def lines(self) -> np.ndarray:
+        """
+        Центры линий поглощения кислорода и водяного пара (P676-13) в диапазоне [nu_start, nu_stop], ГГц
+        """
+        f = np.concatenate([attenuation.Oxygen.P676_13.table[:, 0], attenuation.WaterVapor.P676_13.table[:, 0]])
+        return np.unique(f[(self.nu_start <= f) & (f <= self.nu_stop)])
+
+    def adaptive(self, tolerance: float = 0.01, nu_step_min: float = None, n_start: int = 32) -> np.ndarray:
+        """
+        Спектр на неравномерной сетке частот с контролем ошибки интерполяции
+
+        Расчет начинается с грубой сетки из n_start интервалов, дополненной центрами линий (см. lines).
+        Ошибка линейной интерполяции на интервале [a, b] оценивается как (b - a)^2 / 8 * |Tb''|
+        по вторым разностям в его концах; интервалы длиннее nu_step_min с ошибкой больше tolerance
+        делятся пополам, новые точки всех таких интервалов считаются одним вызовом bt_chunk. Точки
+        сгущаются у линий и на крыльях, на гладком континууме сетка остается грубой. Интервалы,
+        ошибка на которых осталась больше tolerance, сохраняются в self.unresolved (с предупреждением).
+
+        :param tolerance: допустимая ошибка линейной интерполяции яркостной температуры, К
+        :param nu_step_min: шаг сетки, до которого делятся интервалы, ГГц (по умолчанию nu_step);
+            шаг готовой сетки - не меньше nu_step_min / 2
+        :param n_start: число интервалов начальной сетки
+        :return: массив (n_points, 2) или (n_points, 3) по возрастанию частоты, как в bt_chunk
+        """
+        if nu_step_min is None:
+            nu_step_min = self.nu_step
+        frequencies = np.union1d(np.linspace(self.nu_start, self.nu_stop, n_start + 1), self.lines())
+        results = self.bt_chunk(frequencies)
+
+        self.unresolved = np.empty((0, 2))
+        while len(results) > 2:
+            nu, tb = results[:, 0], results[:, 1:]
+            h = np.diff(nu)
+            slope = np.diff(tb, axis=0) / h[:, np.newaxis]
+            # вторая производная в узлах (в крайних - как в соседних)
+            d2 = np.max(np.abs(2 * np.diff(slope, axis=0) / (h[1:] + h[:-1])[:, np.newaxis]), axis=1)
+            d2 = np.concatenate([d2[:1], d2, d2[-1:]])
+            error = h ** 2 / 8 * np.maximum(d2[:-1], d2[1:])
+            split = (error > tolerance) & (h > nu_step_min)
+            if not np.any(split):
+                self.unresolved = np.stack([nu[:-1], nu[1:]], axis=1)[error > tolerance]
+                break
+            middle = self.bt_chunk((nu[:-1][split] + nu[1:][split]) / 2)
+            results = np.concatenate([results, middle])
+            results = results[np.argsort(results[:, 0])]
+        if len(self.unresolved):
+            warnings.warn('adaptive: {} intervals exceed tolerance {} K at the minimum step {} GHz'.format(
+                len(self.unresolved), tolerance, nu_step_min))
+        return results
+
+    def merge(self, levels: np.ndarray) -> 'Initialize':
+        """
+        Профиль из слоев, объединяющих уровни (levels[i - 1], levels[i]]
+
+        Уровень levels[i] получает средние по толщине слоев dh значения T, P, rho_rel, rho,
+        так что сумма a * dh (по ней считаются интегралы, см. Integration) для линейно меняющихся
+        величин сохраняется.
+
+        :param levels: номера верхних уровней слоев по возрастанию, levels[0] = 0
+        """
+        merged = copy.copy(self)
+        starts = np.concatenate([[0], levels[:-1] + 1])
+        thickness = np.add.reduceat(self.dh, starts)
+        for name in ['T', 'P', 'rho_rel', 'rho']:
+            a = self.__getattribute__(name)
+            mean = np.add.reduceat(a * self.dh, starts) / np.where(thickness > 0, thickness, 1.)
+            merged.__setattr__(name, np.where(thickness > 0, mean, a[levels]))
+        merged.alt = self.alt[levels]
+        merged.dh = np.diff(np.insert(merged.alt, 0, self.h_start))
+        return merged
+
+    def panels(self, levels: np.ndarray, panel: int, keep: int = 0) -> 'Initialize':
+        """
+        Профиль из слоев, объединяющих целые панели метода интегрирования
+
+        Веса формул Симпсона (panel = 2) и Буля (panel = 4) зависят от номера уровня по модулю panel,
+        поэтому границы слоев сдвигаются вверх до номеров, кратных panel, и каждый слой заменяется
+        одной панелью из panel шагов. Шаги панели подбираются так, чтобы сумма весов ее уровней
+        в интеграле (см. Integration.cumulative_adjoint) была такой же, как у уровней слоя,
+        а уровни получают средние с этими весами значения T, P, rho_rel, rho (как в merge для метода
+        трапеций). Слои, для которых таких шагов нет, и уровни выше последнего кратного panel номера
+        сохраняются без изменений.
+
+        :param levels: номера верхних уровней слоев по возрастанию, levels[0] = 0
+        :param panel: число шагов в панели метода интегрирования
+        :param keep: уровни 0..keep (с округлением вверх до кратного panel) сохраняются без изменений
+        """
+        n = len(self.alt)
+        top = (n - 1) - (n - 1) % panel
+        prefix = min(top, -(-keep // panel) * panel)
+        bounds = np.unique(np.clip(-(-np.asarray(levels) // panel) * panel, prefix, top))
+
+        # веса уровней в интеграле от нулевого до последнего уровня: на единицу толщины (k) и с толщиной (q)
+        k = Integration.cumulative_adjoint(self.integration_method, np.eye(1, n, n - 1)[0], np.ones(n))
+        q = k * self.dh
+
+        names = ['T', 'P', 'rho_rel', 'rho']
+        parts = {name: [self.__getattribute__(name)[:prefix + 1]] for name in names + ['alt']}
+        for a, b in zip(bounds[:-1], bounds[1:]):
+            c, w = k[b - panel + 1:b + 1], np.sum(q[a + 1:b + 1])
+            h = (self.alt[b] - self.alt[a]) / panel
+            # шаги h * (1 + x * (c - mean(c)) / mean(c)): сумма равна толщине слоя, сумма c * шаг равна w
+            spread = h * np.sum(c * (c - np.mean(c))) / np.mean(c)
+            x = (w - h * np.sum(c)) / spread if spread > 0 else 0.
+            dh = h * (1 + x * (c - np.mean(c)) / np.mean(c))
+            if b - a == panel or w <= 0 or np.any(dh <= 0):
+                for name in parts:
+                    parts[name].append(self.__getattribute__(name)[a + 1:b + 1])
+                continue
+            for name in names:
+                mean = np.sum(q[a + 1:b + 1] * self.__getattribute__(name)[a + 1:b + 1]) / w
+                parts[name].append(np.full(panel, mean))
+            parts['alt'].append(np.append(self.alt[a] + np.cumsum(dh[:-1]), self.alt[b]))
+        for name in parts:
+            parts[name].append(self.__getattribute__(name)[top + 1:])
+
+        merged = copy.copy(self)
+        for name, part in parts.items():
+            merged.__setattr__(name, np.concatenate(part))
+        merged.dh = np.diff(np.insert(merged.alt, 0, self.h_start))
+        return merged
+
+    @staticmethod
+    def decimate(alt: np.ndarray, features: np.ndarray, eps: float, keep: np.ndarray) -> np.ndarray:
+        """
+        Отбор уровней, при котором линейная интерполяция по высоте восстанавливает признаки с ошибкой не больше eps
+
+        На каждом шаге в каждый интервал между отобранными уровнями, где ошибка больше eps,
+        добавляется уровень с наибольшей ошибкой (как в алгоритме Дугласа-Пекера, но для всех интервалов сразу).
+
+        :param alt: высоты уровней (n_levels,)
+        :param features: нормированные признаки (n_features, n_levels)
+        :param eps: допустимая ошибка
+        :param keep: маска уровней, которые отбираются всегда (n_levels,)
+        :return: маска отобранных уровней
+        """
+        keep = keep.copy()
+        keep[[0, -1]] = True
+        while True:
+            kept = np.flatnonzero(keep)
+            error = np.max(np.abs(features - np.asarray([np.interp(alt, alt[kept], f[kept]) for f in features])),
+                           axis=0)
+            # наибольшая ошибка в каждом интервале (kept[i], kept[i + 1])
+            interval = np.searchsorted(kept, np.arange(len(alt)), side='right') - 1
+            order = np.lexsort((-error, interval))
+            first = order[np.flatnonzero(np.diff(np.insert(interval[order], 0, -1)))]
+            add = first[error[first] > eps]
+            if not len(add):
+                return keep
+            keep[add] = True
+
+    def regrid(self, tolerance: float = 0.01, frequencies: np.ndarray = None, h_keep: float = 0.1,
+               n_iter: int = 16) -> tuple:
+        """
+        Прореживание уровней профиля с ограничением на ошибку яркостной температуры
+
+        Уровни, между которыми температура и погонный коэффициент поглощения меняются почти линейно,
+        объединяются в слои (см. decimate, merge). Изломы профиля температуры (инверсии) дают большую
+        ошибку интерполяции и сохраняются; уровни ниже h_keep сохраняются всегда. Порог на ошибку
+        интерполяции подбирается делением пополам так, чтобы яркостная температура на частотах
+        frequencies отличалась от полного расчета не больше чем на tolerance.
+
+        Для метода трапеций уровни слоя объединяются (merge). Веса формул Симпсона и Буля зависят
+        от номера уровня по модулю 2 и 4, поэтому для них каждый слой заменяется целой панелью
+        из 2 или 4 шагов (panels), и прореженный профиль примерно в 2 или 4 раза длиннее,
+        чем для метода трапеций при той же ошибке.
+
+        :param tolerance: допустимая ошибка яркостной температуры, К
+        :param frequencies: частоты проверки, ГГц (по умолчанию - начальная сетка adaptive с центрами линий)
+        :param h_keep: толщина приземного слоя, в котором сохраняются все уровни, км
+        :param n_iter: число шагов подбора порога
+        :return: Initialize с прореженным профилем, достигнутая ошибка яркостной температуры, К
+        """
+        if frequencies is None:
+            frequencies = np.union1d(np.linspace(self.nu_start, self.nu_stop, 17), self.lines())
+        if len(self.T) < 3:
+            return self, 0.
+        g = self.gamma(frequencies)
+        T = self.T + 273.15
+        features = np.concatenate([[T / max(np.ptp(T), 1.)], g / np.max(g, axis=-1, keepdims=True)])
+
+        keep = (self.alt - self.h_start) < h_keep
+        panel = {Integration.Methods.TRAPZ.value: 1,
+                 Integration.Methods.SIMPSON.value: 2}.get(self.integration_method, 4)
+
+        reference = self.brightness(g)
+        best, best_error = self, 0.
+        lower, upper = -6., 0.
+        for _ in range(n_iter):
+            eps = (lower + upper) / 2
+            levels = np.flatnonzero(Initialize.decimate(self.alt, features, 10 ** eps, keep))
+            if panel == 1:
+                reduced = self.merge(levels)
+            else:
+                reduced = self.panels(levels, panel, np.count_nonzero(keep) - 1)
+            # промежуточные профили не сохраняются в кэше
+            reduced.use_cache = False
+            e = float(np.max(np.abs(reduced.bt_downwelling_batch(frequencies) - reference)))
+            if e <= tolerance:
+                lower = eps
+                if len(reduced.T) < len(best.T):
+                    best, best_error = reduced, e
+            else:
+                upper = eps
+        best.use_cache = self.use_cache
+        return best, best_error
+
+    def bt_downwelling_jacobian(self, frequencies: np.ndarray = None,
+                                dT: float = 0.01, drho: float = 0.001) -> tuple:
+        """
+        Яркостная температура нисходящего излучения и весовые функции по температуре и абсолютной влажности
+
+        Производные по погонному коэффициенту поглощения на всех уровнях получаются за один проход
+        по профилю пропускания (Integration.cumulative_adjoint). Коэффициент поглощения на уровне зависит
+        только от T, P, rho этого уровня, поэтому его производные по T и rho считаются центральными
+        разностями для всех уровней сразу: 5 расчетов поглощения вместо 2 * n_levels решений.
+
+        :param frequencies: частоты в ГГц (по умолчанию self.frequencies)
+        :param dT: шаг разности по температуре, К
+        :param drho: шаг разности по абсолютной влажности, г/м^3
+        :return: brt (n_freq,), dTb/dT (n_freq, n_levels) в К/К, dTb/drho (n_freq, n_levels) в К/(г/м^3)
+        """
+        if frequencies is None:
+            frequencies = self.frequencies
+
+        def gamma(T: np.ndarray, rho: np.ndarray) -> np.ndarray:
+            with self.__tables():
+                return self.sec * (attenuation.Oxygen.gamma_batch(self.oxygen_model, frequencies, T, self.P, rho) +
+                                   attenuation.WaterVapor.gamma_batch(self.water_vapor_model, frequencies,
+                                                                      T, self.P, rho))
+
+        g = self.gamma(frequencies)
+        T = self.T + 273.15
+
+        tau = Integration.cumulative(method=self.integration_method, a=g, dh=self.dh)
+        inf = np.shape(g)[-1] - 1
+        transmittance = np.exp(-1 * tau)
+        brt = Integration.integrate(method=self.integration_method, a=T * g * transmittance,
+                                    lower=0, upper=inf, dh=self.dh)
+
+        background = 0.
+        if self.relic_background:
+            background = 2.72548 * at(transmittance, inf)
+
+        # веса внешнего интеграла: integrate(a, 0, inf) = sum(q * a)
+        q = Integration.cumulative_adjoint(self.integration_method, np.eye(inf + 1)[inf], self.dh)
+        # полная производная яркостной температуры по g на каждом уровне (с учетом оптической толщины выше)
+        d_g = q * T * transmittance - \
+            Integration.cumulative_adjoint(self.integration_method, q * T * g * transmittance, self.dh) - \
+            np.multiply.outer(background, q)
+
+        d_T = q * g * transmittance + \
+            d_g * (gamma(self.T + dT, self.rho) - gamma(self.T - dT, self.rho)) / (2 * dT)
+        d_rho = d_g * (gamma(self.T, self.rho + drho) - gamma(self.T, self.rho - drho)) / (2 * drho)
+        return brt + background, d_T, d_rho
+
+    def scan(self, thetas: np.ndarray, frequencies: np.ndarray = None) -> np.ndarray:
+        """
+        Яркостная температура нисходящего излучения для набора углов наблюдения
+
+        Поглощение и оптическая толщина в зенит считаются один раз, для угла theta
+        они умножаются на sec(theta) (плоскослоистая атмосфера)
+
+        :param thetas: углы наблюдения от зенита, градусы
+        :param frequencies: частоты в ГГц (по умолчанию self.frequencies)
+        :return: массив (n_angles, n_freq)
+        """
+        if frequencies is None:
+            frequencies = self.frequencies
+        sec = 1. / np.cos(np.ravel(thetas) * np.pi / 180.)
+        T = self.T + 273.15
+        inf = len(self.T) - 1
+
+        brt = np.empty((len(sec), len(frequencies)))
+        step = max(1, attenuation.max_bytes // (8 * 4 * len(sec) * max(1, len(self.T))))
+        for start in range(0, len(frequencies), step):
+            g = self.absorption(frequencies[start:start + step])
+            tau = Integration.cumulative(method=self.integration_method, a=g, dh=self.dh)
+            # (n_angles, n_freq, n_levels)
+            s = sec[:, np.newaxis, np.newaxis]
+            brt[:, start:start + step] = Integration.integrate(method=self.integration_method,
+                                                               a=T * s * g * np.exp(-1 * s * tau),
+                                                               lower=0, upper=inf, dh=self.dh)
+            if self.relic_background:
+                brt[:, start:start + step] += 2.72548 * np.exp(-1 * s[:, :, 0] * at(tau, inf))
+        return brt
+
+    def compare(self, results: np.ndarray, n_check: int = None) -> float:
+        """
+        Наибольшее отклонение результатов от расчета в float64
+
+        :param results: результат __call__ (см. bt_chunk)
+        :param n_check: число равномерно выбранных частот для сравнения (None - все частоты)
+        :return: max |Tb - Tb(float64)|, К
+        """
+        indices, reference = self.__reference(n_check)
+        expected = reference.bt_chunk(self.frequencies[indices])
+        return float(np.max(np.abs(np.asarray(results)[indices, 1:] - expected[:, 1:])))
+
+    def compare_batch(self, tb: np.ndarray, n_check: int = None) -> float:
+        """
+        Наибольшее отклонение результата bt_downwelling_batch(self.frequencies) от расчета в float64
+
+        :param tb: массив (n_freq,) или (n_freq, n_profiles) для объединенных профилей
+        :param n_check: число равномерно выбранных частот для сравнения (None - все частоты)
+        :return: max |Tb - Tb(float64)|, К
+        """
+        indices, reference = self.__reference(n_check)
+        expected = reference.bt_downwelling_batch(self.frequencies[indices])
+        return float(np.max(np.abs(np.asarray(tb)[indices] - expected)))
+
+    def __reference(self, n_check: int) -> tuple:
+        # номера частот для сравнения и те же настройки в float64
+        n = len(self.frequencies)
+        indices = np.arange(n)
+        if n_check is not None and n_check < n:
+            indices = np.unique(np.linspace(0, n - 1, n_check).round().astype(int))
+        reference = copy.copy(self)
+        reference.precision = 'float64'
+        return indices, reference
+
+    def digest(self) -> str:
+        """
+        Ключ расчета: настройки, сетка частот и профиль (см. Writer)
+        """
+        settings = [self.oxygen_model, self.water_vapor_model, self.integration_method, self.theta,
+                    self.relic_background, self.upwelling, self.emissivity, self.surface_temperature,
+                    list(self.lookup_tables), self.precision]
+        return Cache.key('Initialize', repr(settings), self.frequencies, self.T, self.P, self.rho, self.dh)
 
-        results = []
+    @staticmethod
+    def deliver(writer: Writer, indices: np.ndarray, result: np.ndarray,
+                progress: Progress, channel: Channel = None) -> None:
+        """
+        Запись готовой порции и передача ее в канал (('partial', (номера частот, результат)))
+        """
+        with profiling.stage('write'):
+            writer.write(indices, result)
+        progress.update(len(indices))
+        if channel is not None:
+            channel.put('partial', (indices, result))
 
-        with Pool(processes=n_workers) as pool:
-            for result in Tqdm(pool.imap_unordered(self.bt_downwelling, self.frequencies),
-                               total=len(self.frequencies)):
-                results.append(result)
+    def __call__(self, n_workers: int = 1, batch: bool = True, chunks_per_worker: int = 4,
+                 channel: Channel = None, executor: Executor = None, output: str = None,
+                 profile: bool = False, trace: str = None) -> np.ndarray:
+        """
+        :param n_workers: число процессов
+        :param batch: считать порциями частот (иначе - по одной частоте на задачу)
+        :param chunks_per_worker: число порций частот на процесс в пакетном режиме
+        :param channel: канал для передачи прогресса, готовых порций и результатов
+        :param executor: долгоживущий пул процессов (вместо нового пула из n_workers процессов)
+        :param output: файл .npy, в который порции записываются по мере готовности (см. Writer);
+            прерванный расчет с теми же настройками и профилем продолжается с незаписанных частот
+        :param profile: замеры по этапам (см. profiling.py): отчет сохраняется в self.report
+            и передается в канал как ('report', отчет)
+        :param trace: файл JSON для событий замеров в формате Chrome trace (включает profile)
+            При precision = 'float32' наибольшее отклонение от float64 (см. compare) сохраняется
+            в self.deviation и передается в канал как ('deviation', отклонение).
+        :return: массив (n_freq, 2): частота, яркостная температура (при upwelling в пакетном режиме -
+            (n_freq, 3), см. bt_chunk), при output - отображенный из файла; None, если расчет в executor отменен
+        """
+        if not (profile or trace is not None):
+            return self.__run(n_workers, batch, chunks_per_worker, channel, executor, output)
+        profiling.start(trace is not None)
+        profiling.add('humidity', wall=self.__humidity[0], cpu=self.__humidity[1])
+        try:
+            with profiling.stage('call'):
+                results = self.__run(n_workers, batch, chunks_per_worker, channel, executor, output)
+        finally:
+            self.report = profiling.stop(trace)
+        if channel is not None:
+            channel.put('report', self.report)
+        return results
 
-        results = np.asarray(sorted(results, key=lambda _: _[0]))
+    def __run(self, n_workers: int, batch: bool, chunks_per_worker: int,
+              channel: Channel, executor: Executor, output: str) -> np.ndarray:
+        writer = Writer(self.frequencies, 3 if batch and self.upwelling else 2, output, self.digest())
+        pending = writer.pending()
+        n_chunks = max(1, n_workers if executor is None else executor.n_workers) * chunks_per_worker
+        chunks = [_ for _ in np.array_split(pending, n_chunks) if len(_)]
 
-        with open(os.path.join('.tmp', 'results'), 'wb') as dump:
-            np.save(dump, results)
+        if executor is not None:
+            if not executor.run(self, chunks, writer, channel):
+                if channel is not None:
+                    channel.put('cancelled', None)
+                return None
+        elif batch:
+            progress = Progress(total=max(1, len(pending)), channel=channel)
+            if n_workers <= 1:
+                for indices in chunks:
+                    Initialize.deliver(writer, indices, self.bt_chunk(self.frequencies[indices]), progress, channel)
+            else:
+                tasks = [(indices, self.frequencies[indices]) for indices in chunks]
+                profiling.count('ipc/initializer', n_workers, n_workers * profiling.nbytes(self))
+                profiling.count('ipc/tasks', len(tasks), sum(map(profiling.nbytes, tasks)))
+                with profiling.stage('pool/start'):
+                    pool = Pool(processes=n_workers, initializer=_init_worker, initargs=(self, profiling.settings()))
+                with pool:
+                    for indices, result, report in pool.imap_unordered(_bt_chunk, tasks):
+                        profiling.merge(report)
+                        profiling.count('ipc/results', 1, profiling.nbytes(result))
+                        Initialize.deliver(writer, indices, result, progress, channel)
+            progress.close()
+        else:
+            progress = Progress(total=max(1, len(pending)), channel=channel)
+            tasks = [(self, nu, profiling.settings()) for nu in self.frequencies[pending]]
+            profiling.count('ipc/tasks', len(tasks), sum(map(profiling.nbytes, tasks)))
+            with profiling.stage('pool/start'):
+                pool = Pool(processes=n_workers)
+            with pool:
+                for i, (result, report) in zip(pending, pool.imap(_bt_downwelling, tasks)):
+                    profiling.merge(report)
+                    Initialize.deliver(writer, np.asarray([i]), np.asarray([result]), progress, channel)
+            progress.close()
 
-        with open(os.path.join('.tmp', 'progress'), 'wb') as file:
-            dill.dump(100, file)
+        results = writer.results
+        if self.precision != 'float64' and self.precision_check != 0:
+            self.deviation = self.compare(results, self.precision_check)
+            if channel is not None:
+                channel.put('deviation', self.deviation)
+        if channel is not None:
+            channel.put('results', np.array(results))
+            channel.put('progress', 100)
+        return results
@@ -0,0 +1,131 @@
+#  -*- coding: utf-8 -*-
+import copy
+import numpy as np
+import profiling
+from core import Initialize, Channel, Progress, chunk_size, solve_tasks
+from vapor import absolute_humidity
+
+"""
+Ансамблевый расчет (метод Монте-Карло): оценка неопределенности яркостной температуры
+по возмущениям профилей температуры, давления и влажности
+
+Члены ансамбля считаются вместе как объединенные профили (n_members, n_levels) - см. Initialize.stack -
+порциями, объем промежуточных массивов которых ограничен attenuation.max_bytes. Исходный профиль
+передается в процессы один раз через инициализатор пула; возмущения каждого члена генерируются в процессе
+по seed и номеру члена, поэтому результат не зависит ни от числа процессов, ни от размера порций.
+"""
+
+
+class Noise:
+    def __init__(self, T: float = 0.5, P: float = 1., rho_rel: float = 5., length: float = 0.):
+        """
+        Гауссовы возмущения профиля
+
+        :param T: СКО температуры, К
+        :param P: СКО давления, гПа
+        :param rho_rel: СКО относительной влажности, %
+        :param length: радиус корреляции возмущений по высоте, км (0 - независимые уровни)
+        """
+        self.T, self.P, self.rho_rel, self.length = T, P, rho_rel, length
+
+    def sample(self, members: np.ndarray, seed: int, dh: np.ndarray) -> np.ndarray:
+        """
+        :param members: номера членов ансамбля
+        :param seed: начальное значение генератора: возмущения члена зависят только от seed и его номера
+        :return: нормированные возмущения T, P, rho_rel - массив (3, n_members, n_levels)
+            с корреляцией exp(-|dz| / length) между уровнями
+        """
+        e = np.stack([np.random.default_rng([seed, int(m)]).standard_normal((3, len(dh))) for m in members], axis=1)
+        if self.length <= 0.:
+            return e
+        # процесс авторегрессии первого порядка по высоте
+        r = np.exp(-1 * np.abs(dh) / self.length)
+        s = np.sqrt(1. - r * r)
+        for i in range(1, len(dh)):
+            e[..., i] = r[i] * e[..., i - 1] + s[i] * e[..., i]
+        return e
+
+    def perturb(self, base: Initialize, members: np.ndarray, seed: int = 0) -> dict:
+        """
+        :return: возмущенные профили T, P, rho_rel - массивы (n_members, n_levels)
+        """
+        e = self.sample(members, seed, base.dh)
+        return dict(T=base.T + self.T * e[0],
+                    P=np.maximum(base.P + self.P * e[1], 1e-3),
+                    rho_rel=np.clip(base.rho_rel + self.rho_rel * e[2], 0., 100.))
+
+
+_base, _noise, _members, _seed = None, None, None, None
+
+
+def _init_worker(base: Initialize, noise: Noise, members: dict, seed: int) -> None:
+    global _base, _noise, _members, _seed
+    _base, _noise, _members, _seed = base, noise, members, seed
+
+
+def _perturbed(base: Initialize, noise: Noise, members: dict, seed: int, start: int, stop: int) -> Initialize:
+    if members is not None:
+        profiles = {name: np.broadcast_to(members[name][start:stop] if name in members else
+                                          base.__getattribute__(name), (stop - start, len(base.T)))
+                    for name in ['T', 'P', 'rho_rel']}
+    else:
+        profiles = noise.perturb(base, np.arange(start, stop), seed)
+    core = copy.copy(base)
+    core.T, core.P, core.rho_rel = profiles['T'], profiles['P'], profiles['rho_rel']
+    with profiling.stage('humidity'):
+        core.rho = absolute_humidity(core.T, core.P, core.rho_rel)
+    # возмущенные профили не сохраняются в кэше
+    core.use_cache = False
+    return core
+
+
+def _solve(task: tuple) -> tuple:
+    start, stop = task
+    core = _perturbed(_base, _noise, _members, _seed, start, stop)
+    return start, core.bt_downwelling_batch(core.frequencies).T
+
+
+def run(base: Initialize, noise: Noise = None, n_members: int = 100, members: dict = None,
+        quantiles: tuple = (0.05, 0.5, 0.95), seed: int = 0, n_workers: int = 1,
+        channel: Channel = None, max_bytes: int = None) -> tuple:
+    """
+    Статистики яркостной температуры нисходящего излучения по ансамблю профилей
+
+    :param base: исходный профиль и настройки расчета
+    :param noise: модель возмущений (если members не задан)
+    :param n_members: число членов ансамбля
+    :param members: явно заданные профили {'T', 'P', 'rho_rel'} - массивы (n_members, n_levels)
+        на уровнях base (после отбора по [h_start, h_stop]); недостающие переменные берутся из base
+    :param quantiles: уровни квантилей
+    :param seed: начальное значение генератора случайных чисел
+    :param n_workers: число процессов
+    :param channel: канал для передачи прогресса (см. core.Channel); при precision != 'float64'
+        в канал передается ('deviation', max |Tb - Tb(float64)|) по первой порции членов ансамбля
+    :param max_bytes: ограничение на объем промежуточных массивов порции (по умолчанию attenuation.max_bytes)
+    :return: frequencies (n_freq,), mean (n_freq,), std (n_freq,), quantiles (n_quantiles, n_freq),
+        tb (n_members, n_freq)
+    """
+    if members is not None:
+        members = {name: np.asarray(a, dtype=float) for name, a in members.items()}
+        n_members = len(next(iter(members.values())))
+    elif noise is None:
+        noise = Noise()
+    frequencies = base.frequencies
+    size = chunk_size(len(frequencies), len(base.T), np.dtype(base.precision).itemsize, max_bytes)
+    tasks = [(start, min(start + size, n_members)) for start in range(0, n_members, size)]
+
+    tb = np.empty((n_members, len(frequencies)))
+    progress = Progress(total=n_members, channel=channel)
+
+    for start, result in solve_tasks(_solve, tasks, _init_worker, (base, noise, members, seed), n_workers):
+        tb[start:start + len(result)] = result
+        progress.update(len(result))
+    progress.close()
+    if tasks and channel is not None and base.precision != 'float64' and base.precision_check != 0:
+        start, stop = tasks[0]
+        core = _perturbed(base, noise, members, seed, start, stop)
+        channel.put('deviation', core.compare_batch(tb[start:stop].T, base.precision_check))
+    if channel is not None:
+        channel.put('progress', 100)
+    return frequencies, np.mean(tb, axis=0), np.std(tb, axis=0, ddof=1 if n_members > 1 else 0), \
+        np.quantile(tb, quantiles, axis=0), tb
@@ -0,0 +1,94 @@
+#  -*- coding: utf-8 -*-
+import copy
+import numpy as np
+from core import Initialize, Channel, Progress, chunk_size, solve_tasks
+from vapor import absolute_humidity
+
+"""
+Расчет карт яркостной температуры по трехмерным полям (nx, ny, n_levels), например, по выходу численной модели
+"""
+
+_template = None
+
+
+def _init_worker(template: Initialize) -> None:
+    global _template
+    _template = template
+
+
+def _columns(template: Initialize, task: tuple) -> Initialize:
+    _, T, P, rho, dh = task
+    core = copy.copy(template)
+    core.T, core.P, core.rho, core.dh = T, P, rho, dh
+    return core
+
+
+def _solve(task: tuple) -> tuple:
+    core = _columns(_template, task)
+    # (n_freq, n_columns, n_levels) - ранг 3, как в integration.at/diap
+    return task[0], core.bt_downwelling_batch(core.frequencies)
+
+
+def tiles(n_columns: int, n_freq: int, n_levels: int, max_bytes: int = None, itemsize: int = 8) -> list:
+    """
+    Разбиение столбцов сетки на порции, при которых промежуточные массивы (n_freq, n_columns, n_levels)
+    укладываются в max_bytes
+
+    :param itemsize: размер элемента промежуточных массивов, байт (4 - при precision = 'float32')
+    :return: список (start, stop)
+    """
+    size = chunk_size(n_freq, n_levels, itemsize, max_bytes)
+    return [(start, min(start + size, n_columns)) for start in range(0, n_columns, size)]
+
+
+def brightness_map(T: np.ndarray, P: np.ndarray, alt: np.ndarray,
+                   rho: np.ndarray = None, rho_rel: np.ndarray = None,
+                   n_workers: int = 1, max_bytes: int = None, channel: Channel = None, **config) -> tuple:
+    """
+    Карты яркостной температуры нисходящего излучения
+
+    :param T: температура, град. Цельс., (nx, ny, n_levels)
+    :param P: давление, гПа, (nx, ny, n_levels)
+    :param alt: высоты уровней, км: (n_levels,) - общая сетка, уровни отбираются по [h_start, h_stop];
+        (nx, ny, n_levels) - используются все уровни
+    :param rho: абсолютная влажность, г/м^3, (nx, ny, n_levels)
+    :param rho_rel: относительная влажность, % (если rho не задана)
+    :param n_workers: число процессов
+    :param max_bytes: ограничение на объем промежуточных массивов одной порции (по умолчанию attenuation.max_bytes)
+    :param channel: канал для передачи прогресса (см. core.Channel); при precision != 'float64'
+        в канал передается ('deviation', max |Tb - Tb(float64)|) по первой порции столбцов
+    :param config: настройки Initialize (модели, метод интегрирования, высоты, частоты, угол...)
+    :return: frequencies (n_freq,), tb (n_freq, nx, ny)
+    """
+    template = Initialize(**config)
+    if rho is None:
+        rho = absolute_humidity(T, P, rho_rel)
+    T, P, rho = np.broadcast_arrays(*[np.asarray(_, dtype=float) for _ in [T, P, rho]])
+    nx, ny = T.shape[:2]
+
+    alt = np.asarray(alt, dtype=float)
+    if np.ndim(alt) == 1:
+        cond = (template.h_start <= alt) & (alt <= template.h_stop)
+        T, P, rho, alt = T[:, :, cond], P[:, :, cond], rho[:, :, cond], alt[cond]
+    dh = np.diff(np.insert(np.broadcast_to(alt, T.shape), 0, template.h_start, axis=-1), axis=-1)
+
+    n_levels = T.shape[-1]
+    T, P, rho, dh = map(lambda _: np.reshape(_, (nx * ny, n_levels)), [T, P, rho, dh])
+    frequencies = template.frequencies
+    tasks = [(start, T[start:stop], P[start:stop], rho[start:stop], dh[start:stop])
+             for start, stop in tiles(nx * ny, len(frequencies), n_levels, max_bytes,
+                                      np.dtype(template.precision).itemsize)]
+
+    tb = np.empty((len(frequencies), nx * ny))
+    progress = Progress(total=nx * ny, channel=channel)
+
+    for start, result in solve_tasks(_solve, tasks, _init_worker, (template,), n_workers):
+        tb[:, start:start + result.shape[-1]] = result
+        progress.update(result.shape[-1])
+    progress.close()
+    if tasks and channel is not None and template.precision != 'float64' and template.precision_check != 0:
+        core = _columns(template, tasks[0])
+        channel.put('deviation', core.compare_batch(tb[:, :len(core.T)], template.precision_check))
+    if channel is not None:
+        channel.put('progress', 100)
+    return frequencies, tb.reshape((len(frequencies), nx, ny))
@@ -9,7 +9,8 @@ import multiprocessing
 import numpy as np
 import attenuation
 from integration import Integration
-from core import Initialize
+from core import Initialize, Channel, Executor
+from archive import Archive
 from matplotlib import pyplot as plt
 from matplotlib.axes import Axes
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg, NavigationToolbar2Tk
@@ -32,8 +33,14 @@ class Model:
         self.progress = IntVar(value=0)
 
     def load_data(self, path='radiosonde.gridded') -> None:
-        with open(path, 'rb') as dump:
-            self.data = dill.load(dump)
+        packed = os.path.splitext(path)[0] + '.packed'
+        if os.path.isdir(path):
+            self.data = Archive(path)
+        elif Archive.is_fresh(path, packed):
+            self.data = Archive(packed)
+        else:
+            with open(path, 'rb') as dump:
+                self.data = dill.load(dump)
 
     @property
     def session_keys(self) -> np.ndarray:
@@ -107,6 +114,7 @@ def compute():
         plot_new.set(value=False)
         button_erase.config(state=NORMAL)
 
+    global window2
     window2 = Toplevel(root)
     window2.title('Подождите...')
     window2.geometry('{:.0f}x{:.0f}'.format(400, 35))
@@ -118,60 +126,76 @@ def compute():
     progressbar = ttk.Progressbar(window2, orient="horizontal", variable=m.progress, length=100, style="TProgressbar")
     progressbar.pack(side=TOP, fill=BOTH, padx=1, pady=1)
 
-    def progress_callback(*_):
-        if m.progress.get() >= 100:
-            stop_listen.set()
-            m.progress.set(0)
+    global channel
+    channel = Channel()
 
-            with open(os.path.join('.tmp', 'results'), 'rb') as dump:
-                results = np.load(dump)
+    core = Initialize(cache_path=os.path.join('.tmp', 'cache'), **m.get_current_state())
 
-            window2.destroy()
-            button_compute.config(state=NORMAL)
+    # спектр рисуется по мере готовности порций частот
+    spectrum = np.full(len(core.frequencies), np.nan)
+    line, = ax.plot(core.frequencies, spectrum)
 
-            ax.plot(results[:, 0], results[:, 1])
-            ax.set_xlabel(r'Частота $\nu$, ГГц')
-            ax.set_ylabel(r'Яркостная температура, К')
-            plt.grid(ls=':')
-            plt.tight_layout()
-            canvas.draw()
+    def draw(indices, result):
+        spectrum[indices] = result[:, 1]
+        line.set_ydata(spectrum)
+        ax.relim()
+        ax.autoscale_view()
+        canvas.draw_idle()
+        window.deiconify()
 
-            button_erase.config(state=NORMAL)
-            window.deiconify()
+    def show(results):
+        m.progress.set(0)
 
-    m.progress.trace('w', progress_callback)
+        close_progress()
+        button_compute.config(state=NORMAL)
 
-    core = Initialize(**m.get_current_state())
-    n_workers = os.cpu_count()
-    threading.Thread(target=core, args=(n_workers,)).start()
+        line.set_data(results[:, 0], results[:, 1])
+        ax.relim()
+        ax.autoscale_view()
+        ax.set_xlabel(r'Частота $\nu$, ГГц')
+        ax.set_ylabel(r'Яркостная температура, К')
+        plt.grid(ls=':')
+        plt.tight_layout()
+        canvas.draw()
 
-    if stop_listen.is_set():
-        stop_listen.clear()
-    threading.Thread(target=listen).start()
+        button_erase.config(state=NORMAL)
+        window.deiconify()
 
+    # результаты записываются в файл по мере расчета: прерванный расчет с теми же параметрами продолжается
+    # поток не мешает завершению программы: при закрытии окна пул останавливается (executor.close),
+    # и поток может остаться в ожидании результатов
+    threading.Thread(target=core, kwargs=dict(channel=channel, executor=executor,
+                                              output=os.path.join('.tmp', 'results.npy')),
+                     daemon=True).start()
 
-def listen():
-    while True:
-        if stop_listen.is_set():
-            break
-        try:
-            with open(os.path.join('.tmp', 'progress'), 'rb') as file:
-                m.progress.set(dill.load(file))
-        except FileNotFoundError:
-            pass
-        except EOFError:
-            pass
+    root.after(poll_interval, listen, channel, show, draw)
+
+
+def listen(ch: Channel, callback, partial) -> None:
+    # опрос канала из цикла событий Tk; после сброса (clear) старый канал больше не опрашивается
+    if ch is not channel:
+        return
+    for kind, value in ch.get():
+        if kind == 'progress':
+            m.progress.set(value)
+        if kind == 'partial':
+            partial(*value)
+        if kind == 'results':
+            callback(value)
+            return
+    root.after(poll_interval, listen, ch, callback, partial)
 
 
 def clear():
-    stop_listen.set()
-    try:
-        os.remove(os.path.join('.tmp', 'results'))
-        os.remove(os.path.join('.tmp', 'progress'))
-    except FileNotFoundError:
-        pass
-    # except PermissionError:
-    #     pass
+    global channel
+    channel = None
+
+
+def close_progress():
+    global window2
+    if isinstance(window2, Toplevel):
+        window2.destroy()
+    window2 = None
 
 
 def erase(destroy: bool = False):
@@ -188,9 +212,14 @@ def erase(destroy: bool = False):
 
     button_compute.config(state=NORMAL)
 
+    # расчет, если он еще идет, отменяется
+    executor.cancel()
     clear()
+    close_progress()
+    m.progress.set(0)
 
     if destroy:
+        executor.close()
         root.destroy()
         root.quit()
 
@@ -207,8 +236,12 @@ def check_key_callback(*_) -> None:
 if __name__ == '__main__':
     multiprocessing.freeze_support()
 
-    stop_listen = threading.Event()
-    clear()
+    channel = None
+    poll_interval = 50  # мс
+
+    # процессы запускаются один раз и используются всеми расчетами
+    executor = Executor(os.cpu_count())
+    executor.start()
 
     root = Tk()
     root.title('GUI')
@@ -217,8 +250,6 @@ if __name__ == '__main__':
 
     m = Model.load()
 
-    m.load_data('radiosonde.gridded')
-
     main_menu = Menu(root)
     root.config(menu=main_menu)
     menu = [Menu(main_menu, tearoff=0)]
@@ -303,6 +334,7 @@ if __name__ == '__main__':
     theta_sb.place(relx=.46, y=y_level * 8, anchor="w")
 
     window, canvas, figure, ax = [None] * 4
+    window2 = None
     plot_new = BooleanVar(value=True)
     button_compute = Button(root, text="Вычислить", width=20, height=1, cursor='hand2')
     button_compute.place(relx=.35, y=y_level * 9.5, anchor="center")
@@ -0,0 +1,152 @@
+#  -*- coding: utf-8 -*-
+import json
+import copy
+import numpy as np
+from core import Initialize, Channel
+
+"""
+Яркостная температура в каналах радиометра: свертка с частотной характеристикой (SRF) канала
+
+Точки табличных SRF всех каналов (для двухполосного приемника - в обеих боковых полосах)
+объединяются в один упорядоченный список частот. На каждом участке между соседними точками
+каждая SRF линейна, поэтому на нем выбираются общие для всех каналов узлы квадратуры
+Гаусса-Лежандра, а веса канала - веса квадратуры, умноженные на его SRF в узлах. Квадратура
+не теряет точность на изломах SRF, а перекрывающиеся каналы (разные поляризации, общие или
+частично совпадающие полосы) используют одни и те же узлы. Яркостная температура считается
+только в узлах (Initialize.__call__), яркостная температура канала - взвешенная сумма по узлам.
+
+Описание каналов (JSON) - список словарей с полями Band: centre, bandwidth, srf, if_offset, sideband_ratio, name.
+"""
+
+
+class Band:
+    def __init__(self, centre: float, bandwidth: float, srf: np.ndarray = None,
+                 if_offset: float = 0., sideband_ratio: float = 1., name: str = ''):
+        """
+        :param centre: центральная частота канала (для двухполосного приемника - частота гетеродина), ГГц
+        :param bandwidth: ширина полосы пропускания (одной боковой полосы), ГГц
+        :param srf: частотная характеристика - массив (n, 2): отстройка от центра полосы (ГГц), отклик
+            (по умолчанию - прямоугольная в полосе bandwidth)
+        :param if_offset: промежуточная частота двухполосного приемника: полосы с центрами centre -/+ if_offset, ГГц
+            (0 - однополосный канал)
+        :param sideband_ratio: отношение чувствительности верхней боковой полосы к нижней
+        :param name: имя канала
+        """
+        self.centre, self.bandwidth = float(centre), float(bandwidth)
+        self.srf = None if srf is None else np.asarray(srf, dtype=float)
+        self.if_offset, self.sideband_ratio = float(if_offset), float(sideband_ratio)
+        self.name = name
+
+    @staticmethod
+    def load(path: str) -> list:
+        """
+        Чтение описаний каналов из файла JSON
+        """
+        with open(path, 'r', encoding='utf-8') as file:
+            return [Band(**band) for band in json.load(file)]
+
+    def table(self) -> tuple:
+        """
+        :return: точки SRF по возрастанию отстройки: offsets (n,), response (n,)
+        """
+        if self.srf is None:
+            return np.asarray([-self.bandwidth / 2, self.bandwidth / 2]), np.ones(2)
+        order = np.argsort(self.srf[:, 0], kind='stable')
+        return self.srf[order, 0], self.srf[order, 1]
+
+    def sidebands(self) -> list:
+        """
+        :return: боковые полосы [(центр, множитель чувствительности, направление отстройки)];
+            отстройка нижней полосы двухполосного приемника отсчитывается вниз по частоте
+        """
+        if self.if_offset:
+            return [(self.centre - self.if_offset, 1., -1.), (self.centre + self.if_offset, self.sideband_ratio, 1.)]
+        return [(self.centre, 1., 1.)]
+
+    def breakpoints(self) -> np.ndarray:
+        """
+        :return: частоты точек SRF во всех боковых полосах, ГГц
+        """
+        offsets, _ = self.table()
+        return np.concatenate([centre + direction * offsets for centre, _, direction in self.sidebands()])
+
+    def response(self, frequencies: np.ndarray) -> np.ndarray:
+        """
+        Чувствительность канала на частотах frequencies (ГГц) с учетом обеих боковых полос
+        """
+        offsets, response = self.table()
+        return sum(ratio * np.interp(direction * (np.asarray(frequencies) - centre), offsets, response,
+                                     left=0., right=0.)
+                   for centre, ratio, direction in self.sidebands())
+
+    def nodes(self, node_spacing: float = 0.1, n_min: int = 3) -> tuple:
+        """
+        Узлы и веса квадратуры канала (см. weights)
+
+        :param node_spacing: наибольшее расстояние между узлами, ГГц
+        :param n_min: наименьшее число узлов в полосе
+        :return: frequencies (n_nodes,), weights (n_nodes,) - сумма весов равна 1
+        """
+        frequencies, W = weights([self], node_spacing, n_min)
+        return frequencies, W[0]
+
+
+def weights(bands: list, node_spacing: float = 0.1, n_min: int = 3, resolution: float = 1e-6) -> tuple:
+    """
+    Общие узлы всех каналов и матрица весов
+
+    Узлы Гаусса-Лежандра выбираются на участках между соседними точками SRF всех каналов,
+    на которых чувствительность хотя бы одного канала не равна нулю. Число узлов на участке
+    определяется node_spacing и тем, чтобы в полосе каждого канала было не меньше n_min узлов.
+
+    :param node_spacing: наибольшее расстояние между узлами, ГГц
+    :param n_min: наименьшее число узлов в полосе
+    :param resolution: точки SRF, отстоящие друг от друга меньше чем на resolution (ГГц), объединяются
+    :return: frequencies (n_nodes,), W (n_bands, n_nodes): Tb каналов = W @ Tb(frequencies)
+    """
+    points = np.unique(np.concatenate([band.breakpoints() for band in bands]))
+    points = points[np.insert(np.diff(points) >= resolution, 0, True)]
+    widths = [np.ptp(band.table()[0]) for band in bands]
+
+    frequencies, W = [], []
+    for lower, upper in zip(points[:-1], points[1:]):
+        active = [i for i, band in enumerate(bands) if band.response((lower + upper) / 2) > 0.]
+        if not active:
+            continue
+        n = max([2, int(np.ceil((upper - lower) / node_spacing))] +
+                [int(np.ceil(n_min * (upper - lower) / widths[i])) for i in active])
+        x, wx = np.polynomial.legendre.leggauss(n)
+        f = (upper - lower) / 2 * x + (upper + lower) / 2
+        w = np.zeros((len(bands), n))
+        for i in active:
+            w[i] = (upper - lower) / 2 * wx * bands[i].response(f)
+        frequencies.append(f)
+        W.append(w)
+    W = np.concatenate(W, axis=1) if W else np.zeros((len(bands), 0))
+    total = np.sum(W, axis=1)
+    for band, t in zip(bands, total):
+        if t <= 0.:
+            raise ValueError('band {} has zero spectral response'.format(band.name or band.centre))
+    return np.concatenate(frequencies), W / total[:, np.newaxis]
+
+
+def brightness(instance: Initialize, bands: list, n_workers: int = 1, channel: Channel = None,
+               node_spacing: float = 0.1, n_min: int = 3, resolution: float = 1e-6, **kwargs) -> np.ndarray:
+    """
+    Яркостная температура в каналах радиометра
+
+    :param instance: профиль и настройки расчета (сетка частот instance не используется)
+    :param bands: список Band
+    :param n_workers: число процессов
+    :param channel: канал для передачи прогресса (см. core.Channel)
+    :param kwargs: остальные параметры Initialize.__call__
+    :return: массив (n_bands,) или, при upwelling, (n_bands, 2) - нисходящее и восходящее излучение
+    """
+    frequencies, W = weights(bands, node_spacing, n_min, resolution)
+    nodes = copy.copy(instance)
+    nodes.frequencies = frequencies
+    results = nodes(n_workers, channel=channel, **kwargs)
+    if results is None:
+        return None
+    tb = W @ np.asarray(results)[:, 1:]
+    return tb[:, 0] if tb.shape[1] == 1 else tb
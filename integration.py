@@ -10,6 +10,8 @@ def diap(a: Union[float, np.ndarray], start: int, stop: int, step: int = 1) -> U
         return a
     if rank == 1:
         return a[start:stop:step]
+    if rank == 2:
+        return a[:, start:stop:step]
     if rank == 3:
         return a[:, :, start:stop:step]
     raise RuntimeError('wrong rank')
@@ -21,6 +23,8 @@ def at(a: Union[float, np.ndarray], index: int) -> Union[float, np.ndarray]:
         return a
     if rank == 1:
         return a[index]
+    if rank == 2:
+        return a[:, index]
     if rank == 3:
         return a[:, :, index]
     raise RuntimeError('wrong rank')
@@ -59,6 +63,95 @@ class Integration:
         # default
         return Integration.boole(a, lower, upper, dh)
 
+    @staticmethod
+    def __exclusive_cumsum(w: np.ndarray, mask: np.ndarray, start: int = 0) -> np.ndarray:
+        # s[..., h - start] = sum(w[..., i] for i < h if mask[i]) для h >= start
+        s = np.cumsum(np.where(mask[start:], w[..., start:], 0.), axis=-1)
+        s = np.concatenate([np.zeros_like(s[..., :1]), s[..., :-1]], axis=-1)
+        if start:
+            s += np.sum(np.where(mask[:start], w[..., :start], 0.), axis=-1, keepdims=True)
+        return s
+
+    @staticmethod
+    def cumulative_trapz(a: np.ndarray, dh: np.ndarray, start: int = 0) -> np.ndarray:
+        """
+        Накопленный интеграл по формуле трапеций: trapz(a, 0, h, dh) для всех h >= start сразу
+        """
+        w = a * dh
+        i = np.arange(np.shape(w)[-1])
+        return Integration.__exclusive_cumsum(w, i >= 1, start) + (w[..., :1] + w[..., start:]) / 2.
+
+    @staticmethod
+    def cumulative_simpson(a: np.ndarray, dh: np.ndarray, start: int = 0) -> np.ndarray:
+        """
+        Накопленный интеграл по формуле Симпсона: simpson(a, 0, h, dh) для всех h >= start сразу
+        """
+        w = a * dh
+        i = np.arange(np.shape(w)[-1])
+        return (w[..., :1] + w[..., start:] +
+                4 * Integration.__exclusive_cumsum(w, i % 2 == 1, start) +
+                2 * Integration.__exclusive_cumsum(w, (i % 2 == 0) & (i >= 2), start)) / 3.
+
+    @staticmethod
+    def cumulative_boole(a: np.ndarray, dh: np.ndarray, start: int = 0) -> np.ndarray:
+        """
+        Накопленный интеграл по правилу Буля: boole(a, 0, h, dh) для всех h >= start сразу
+        """
+        w = a * dh
+        i = np.arange(np.shape(w)[-1])
+        return (14 * (w[..., :1] + w[..., start:]) +
+                64 * Integration.__exclusive_cumsum(w, i % 2 == 1, start) +
+                24 * Integration.__exclusive_cumsum(w, i % 4 == 2, start) +
+                28 * Integration.__exclusive_cumsum(w, (i % 4 == 0) & (i >= 4), start)) / 45.
+
+    @staticmethod
+    def cumulative(method: str, a: np.ndarray, dh: np.ndarray, start: int = 0) -> np.ndarray:
+        """
+        Накопленный интеграл от нулевого уровня до каждого уровня (по последней оси)
+
+        :param method: метод интегрирования (см. Integration.Methods)
+        :param a: подынтегральная функция, уровни по последней оси
+        :param dh: шаги по высоте
+        :param start: первый уровень результата: при изменении a только на уровнях start и выше
+            накопленный интеграл ниже start не меняется и может не пересчитываться
+        :return: массив той же формы, что и a (при start > 0 - уровни start и выше)
+        """
+        if method == Integration.Methods.TRAPZ.value:
+            return Integration.cumulative_trapz(a, dh, start)
+        if method == Integration.Methods.SIMPSON.value:
+            return Integration.cumulative_simpson(a, dh, start)
+        # default
+        return Integration.cumulative_boole(a, dh, start)
+
+    @staticmethod
+    def cumulative_adjoint(method: str, u: np.ndarray, dh: np.ndarray) -> np.ndarray:
+        """
+        Сопряженный к накопленному интегралу оператор: если tau = cumulative(method, a, dh),
+        то sum(u * d tau) = sum(cumulative_adjoint(method, u, dh) * d a) для любых приращений a
+
+        :param method: метод интегрирования (см. Integration.Methods)
+        :param u: веса накопленного интеграла по уровням (по последней оси)
+        :param dh: шаги по высоте
+        :return: массив той же формы, что и u
+        """
+        i = np.arange(np.shape(u)[-1])
+        total = np.sum(u, axis=-1, keepdims=True)
+        # r[..., i] = sum(u[..., j] for j > i)
+        r = total - np.cumsum(u, axis=-1)
+        # вклад слагаемого w[..., :1] + w
+        b = u + np.where(i == 0, total, 0.)
+        if method == Integration.Methods.TRAPZ.value:
+            return dh * (b / 2. + np.where(i >= 1, r, 0.))
+        if method == Integration.Methods.SIMPSON.value:
+            return dh * (b +
+                         4 * np.where(i % 2 == 1, r, 0.) +
+                         2 * np.where((i % 2 == 0) & (i >= 2), r, 0.)) / 3.
+        # default
+        return dh * (14 * b +
+                     64 * np.where(i % 2 == 1, r, 0.) +
+                     24 * np.where(i % 4 == 2, r, 0.) +
+                     28 * np.where((i % 4 == 0) & (i >= 4), r, 0.)) / 45.
+
     @staticmethod
     def integrate_callable(method: str, f: Callable, lower: int, upper: int, dh: np.ndarray) -> np.ndarray:
         a = np.asarray([f(i) for i in range(lower, upper + 1, 1)])
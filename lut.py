@@ -0,0 +1,242 @@
+#  -*- coding: utf-8 -*-
+import os
+import sys
+import json
+import argparse
+from typing import Union
+import numpy as np
+import attenuation
+import vapor
+
+"""
+Таблицы погонных коэффициентов поглощения для заданной модели и сетки частот
+
+Коэффициенты считаются один раз на сетке (T, P, rho) и хранятся в каталоге:
+gamma.npy - логарифм коэффициента (для водяного пара - gamma / rho), массив (n_freq, n_T, n_P, n_rho),
+открывается через np.memmap;
+frequencies.npy, T.npy, P.npy, rho.npy - оси; meta.json - версия формата, модель и оценка точности.
+Промежуточные значения получаются полилинейной интерполяцией логарифма коэффициента
+(по давлению - по логарифму давления). Наибольшая ошибка интерполяции, найденная при построении
+по случайным атмосферным состояниям из области таблицы, записывается в meta.json (accuracy):
+abs - нп/км, rel - по отношению к наибольшему коэффициенту на той же частоте.
+
+Установленная таблица (Table.install) используется в attenuation.Oxygen/WaterVapor.gamma и gamma_batch
+вместо расчета по модели, если все частоты есть в таблице и все уровни лежат в ее области.
+Таблицы Initialize.lookup_tables устанавливаются только на время расчета (см. load).
+
+    python lut.py Oxygen P676_13 18 27.2 0.1 oxygen.lut
+"""
+
+_loaded = {}
+
+
+class Table:
+    version = 1
+    axes = ('T', 'P', 'rho')
+
+    def __init__(self, path: str):
+        """
+        :param path: каталог таблицы (см. Table.build)
+        """
+        self.path = path
+        with open(os.path.join(path, 'meta.json'), 'r') as file:
+            self.meta = json.load(file)
+        if self.meta.get('version') != Table.version:
+            raise ValueError('unsupported lookup table version {} in {}'.format(self.meta.get('version'), path))
+        self.kind, self.model = self.meta['kind'], self.meta['model']
+        self.frequencies = np.load(os.path.join(path, 'frequencies.npy'))
+        self.T, self.P, self.rho = [np.load(os.path.join(path, name + '.npy')) for name in Table.axes]
+        self.gamma = np.load(os.path.join(path, 'gamma.npy'), mmap_mode='r')
+
+    def __reduce__(self):
+        # в другой процесс передается только путь, файл отображается заново
+        return Table, (self.path,)
+
+    @staticmethod
+    def build(kind: str, model: str, frequencies: np.ndarray, path: str,
+              T: tuple = (-100., 50., 41), P: tuple = (0.1, 1100., 48), rho: tuple = (0., 40., 41),
+              n_check: int = 1000) -> 'Table':
+        """
+        Расчет и сохранение таблицы
+
+        :param kind: 'Oxygen' или 'WaterVapor'
+        :param model: модель поглощения (значение attenuation.Oxygen.Models или WaterVapor.Models)
+        :param frequencies: частоты в ГГц
+        :param path: каталог таблицы
+        :param T: температура, град. Цельс.: (от, до, число узлов)
+        :param P: давление, гПа: (от, до, число узлов), узлы равномерны по логарифму
+        :param rho: абсолютная влажность, г/м^3: (от, до, число узлов)
+        :param n_check: число случайных точек для оценки точности интерполяции
+        """
+        cls = attenuation.Oxygen if kind == 'Oxygen' else attenuation.WaterVapor
+        if model not in [m.value for m in cls.Models]:
+            model = cls.Models.P676_13.value
+        # расчет по модели, даже если для нее уже установлена таблица
+        installed = attenuation.tables.pop((kind, model), None)
+        try:
+            return Table.__build(cls, kind, model, frequencies, path, T, P, rho, n_check)
+        finally:
+            if installed is not None:
+                attenuation.tables[(kind, model)] = installed
+
+    @staticmethod
+    def __build(cls: type, kind: str, model: str, frequencies: np.ndarray, path: str,
+                T: tuple, P: tuple, rho: tuple, n_check: int) -> 'Table':
+        frequencies = np.ravel(np.asarray(frequencies, dtype=float))
+        axes = [np.linspace(*T[:2], int(T[2])), np.geomspace(*P[:2], int(P[2])), np.linspace(*rho[:2], int(rho[2]))]
+        t, p, r = np.meshgrid(*axes, indexing='ij')
+
+        if not os.path.exists(path):
+            os.makedirs(path)
+        np.save(os.path.join(path, 'frequencies.npy'), frequencies)
+        for name, a in zip(Table.axes, axes):
+            np.save(os.path.join(path, name + '.npy'), a)
+        # поглощение в водяном паре почти пропорционально rho: хранится gamma / rho (при rho = 0 - предел)
+        per_rho = kind == 'WaterVapor'
+        if per_rho:
+            r = np.maximum(r, 1e-6)
+        gamma = np.lib.format.open_memmap(os.path.join(path, 'gamma.npy'), mode='w+', dtype='<f8',
+                                          shape=(len(frequencies),) + t.shape)
+        step = max(1, attenuation.max_bytes // (8 * t.size))
+        for start in range(0, len(frequencies), step):
+            gamma[start:start + step] = np.log(np.maximum(
+                cls.gamma_batch(model, frequencies[start:start + step], t, p, r) / (r if per_rho else 1.),
+                np.finfo(float).tiny))
+        gamma.flush()
+        del gamma
+
+        # оценка точности: сравнение с расчетом по модели в случайных точках области с относительной
+        # влажностью до 100% и долей водяного пара до 4% (другие сочетания T, P, rho в атмосфере не встречаются)
+        rng = np.random.default_rng(0)
+        t = rng.uniform(axes[0][0], axes[0][-1], n_check)
+        p = np.exp(rng.uniform(np.log(axes[1][0]), np.log(axes[1][-1]), n_check))
+        r = vapor.absolute_humidity(t, p, rng.uniform(0., 100., n_check))
+        r = np.clip(r * np.minimum(1., 0.04 * p / np.maximum(vapor.pressure(t, r), 1e-12)), axes[2][0], axes[2][-1])
+        meta = dict(version=Table.version, kind=kind, model=model, per_rho=per_rho, accuracy=dict(abs=0., rel=0.))
+        # meta.json записывается после массивов - по нему определяется готовность таблицы
+        with open(os.path.join(path, 'meta.json'), 'w') as file:
+            json.dump(meta, file)
+        table = Table(path)
+        exact = cls.gamma_batch(model, frequencies, t, p, r)
+        error = np.abs(table(frequencies, t, p, r) - exact)
+        # rel - ошибка, отнесенная к наибольшему коэффициенту на той же частоте
+        meta['accuracy'] = dict(abs=float(np.max(error)),
+                                rel=float(np.max(np.max(error, axis=1) /
+                                                 np.maximum(np.max(np.abs(exact), axis=1), np.finfo(float).tiny))))
+        with open(os.path.join(path, 'meta.json'), 'w') as file:
+            json.dump(meta, file, indent=1)
+        return Table(path)
+
+    def install(self) -> None:
+        """
+        Использовать таблицу в attenuation вместо расчета по модели
+        """
+        attenuation.tables[(self.kind, self.model)] = self
+
+    def uninstall(self) -> None:
+        if attenuation.tables.get((self.kind, self.model)) is self:
+            del attenuation.tables[(self.kind, self.model)]
+
+    def indices(self, frequencies: np.ndarray) -> Union[np.ndarray, None]:
+        """
+        :return: номера частот в таблице или None, если каких-то частот в таблице нет
+        """
+        f = np.ravel(np.asarray(frequencies, dtype=float))
+        i = np.clip(np.searchsorted(self.frequencies, f), 0, len(self.frequencies) - 1)
+        j = np.clip(i - 1, 0, len(self.frequencies) - 1)
+        i = np.where(np.abs(self.frequencies[j] - f) < np.abs(self.frequencies[i] - f), j, i)
+        if not np.allclose(self.frequencies[i], f, rtol=0., atol=1e-9):
+            return None
+        return i
+
+    def inside(self, T: np.ndarray, P: np.ndarray, rho: np.ndarray) -> bool:
+        """
+        Все уровни лежат в области таблицы
+        """
+        return all(np.all((a[0] <= x) & (x <= a[-1])) for a, x in zip([self.T, self.P, self.rho], [T, P, rho])
+                   if len(a) > 1)
+
+    @staticmethod
+    def __weights(axis: np.ndarray, x: np.ndarray) -> tuple:
+        # левый узел и вес правого узла по одной оси
+        if len(axis) == 1:
+            return np.zeros(len(x), dtype=int), np.zeros(len(x))
+        i = np.clip(np.searchsorted(axis, x, side='right') - 1, 0, len(axis) - 2)
+        return i, (x - axis[i]) / (axis[i + 1] - axis[i])
+
+    def __call__(self, frequencies: np.ndarray, T: Union[float, np.ndarray], P: Union[float, np.ndarray],
+                 rho: Union[float, np.ndarray]) -> np.ndarray:
+        """
+        Погонный коэффициент поглощения полилинейной интерполяцией по таблице
+
+        :param frequencies: частоты в ГГц (из таблицы)
+        :return: массив (n_freq, *T.shape)
+        """
+        shape, T, P, rho = attenuation._levels(T, P, rho)
+        f = self.indices(frequencies)
+        weights = [Table.__weights(a, x) for a, x in
+                   zip([self.T, np.log(self.P), self.rho], [T, np.log(P), rho])]
+        n = self.gamma.shape[1:]
+        table = self.gamma.reshape((len(self.frequencies), -1))
+
+        gamma = np.empty((len(f), len(T)))
+        step = max(1, attenuation.max_bytes // (8 * 4 * max(1, len(T))))
+        for start in range(0, len(f), step):
+            rows = f[start:start + step, np.newaxis]
+            g = 0.
+            for corner in np.ndindex(2, 2, 2):
+                index, weight = 0, 1.
+                for (i, w), c, size in zip(weights, corner, n):
+                    index = index * size + np.minimum(i + c, size - 1)
+                    weight = weight * (w if c else 1. - w)
+                g = g + weight * table[rows, index]
+            gamma[start:start + step] = np.exp(g)
+        if self.meta['per_rho']:
+            gamma *= rho
+        return gamma.reshape((len(f),) + shape)
+
+    def lookup(self, frequencies: np.ndarray, T: Union[float, np.ndarray], P: Union[float, np.ndarray],
+               rho: Union[float, np.ndarray]) -> Union[np.ndarray, None]:
+        """
+        :return: результат интерполяции или None, если частоты или уровни вне таблицы
+        """
+        if rho is None and len(self.rho) > 1:
+            return None
+        _, t, p, r = attenuation._levels(T, P, 0. if rho is None else rho)
+        if self.indices(frequencies) is None or not self.inside(t, p, r):
+            return None
+        return self(frequencies, T, P, 0. if rho is None else rho)
+
+
+def load(paths: list) -> dict:
+    """
+    Загрузка (один раз в процессе) таблиц из каталогов paths
+
+    :return: {(kind, model): Table} - в формате attenuation.tables
+    """
+    tables = {}
+    for path in paths:
+        if path not in _loaded:
+            _loaded[path] = Table(path)
+        tables[(_loaded[path].kind, _loaded[path].model)] = _loaded[path]
+    return tables
+
+
+def main(argv: list = None) -> None:
+    parser = argparse.ArgumentParser(description='Таблица погонных коэффициентов поглощения')
+    parser.add_argument('kind', choices=['Oxygen', 'WaterVapor'])
+    parser.add_argument('model', help='имя элемента перечисления моделей, например P676_13')
+    parser.add_argument('nu_start', type=float)
+    parser.add_argument('nu_stop', type=float)
+    parser.add_argument('nu_step', type=float)
+    parser.add_argument('path', help='каталог таблицы')
+    args = parser.parse_args(argv)
+
+    models = attenuation.Oxygen.Models if args.kind == 'Oxygen' else attenuation.WaterVapor.Models
+    frequencies = np.arange(args.nu_start, args.nu_stop + args.nu_step, args.nu_step)
+    table = Table.build(args.kind, models[args.model].value, frequencies, args.path)
+    print('max error: {abs:.3e} np/km, {rel:.3e} relative'.format(**table.meta['accuracy']))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,151 @@
+#  -*- coding: utf-8 -*-
+import os
+import json
+import time
+import pickle
+
+"""
+Замеры по этапам расчета: время (настенное и процессорное), число вызовов, объем данных
+
+Замеры включаются на время расчета (start/stop, см. Initialize.__call__(profile=True)).
+Пока они выключены, stage возвращает общий пустой контекст, count и nbytes сразу возвращаются.
+Процессы пула возвращают свои замеры вместе с результатами порций (collect), основной процесс
+их складывает (merge). При trace события сохраняются в формате Chrome trace (chrome://tracing, Perfetto).
+"""
+
+enabled, tracing = False, False
+_stats = {}
+_events = []
+# процесс, которому принадлежат замеры: процесс пула, созданный копированием основного, начинает с нуля
+_owner = None
+
+
+class _Null:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+
+_null = _Null()
+
+
+class _Stage:
+    __slots__ = ('name', 'start', 'wall', 'cpu')
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.time()
+        self.wall, self.cpu = time.perf_counter(), time.process_time()
+        return self
+
+    def __exit__(self, *args):
+        wall, cpu = time.perf_counter() - self.wall, time.process_time() - self.cpu
+        add(self.name, wall=wall, cpu=cpu)
+        if tracing:
+            _own()
+            _events.append(dict(name=self.name, ph='X', ts=self.start * 1e6, dur=wall * 1e6, pid=os.getpid(), tid=0))
+        return False
+
+
+def stage(name: str):
+    """
+    Контекст замера этапа name
+    """
+    if not enabled:
+        return _null
+    return _Stage(name)
+
+
+def _own() -> None:
+    global _owner
+    if _owner != os.getpid():
+        _owner = os.getpid()
+        _stats.clear()
+        _events.clear()
+
+
+def add(name: str, count: int = 1, wall: float = 0., cpu: float = 0., nbytes: int = 0) -> None:
+    _own()
+    s = _stats.setdefault(name, [0, 0., 0., 0])
+    s[0] += count
+    s[1] += wall
+    s[2] += cpu
+    s[3] += nbytes
+
+
+def count(name: str, n: int = 1, nbytes: int = 0) -> None:
+    """
+    Учет вызовов и объема данных без замера времени
+    """
+    if enabled:
+        add(name, count=n, nbytes=nbytes)
+
+
+def nbytes(obj) -> int:
+    """
+    Объем объекта при передаче в другой процесс (pickle), байт; 0, если замеры выключены
+    """
+    if not enabled:
+        return 0
+    return len(pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL))
+
+
+def settings() -> tuple:
+    return enabled, tracing
+
+
+def configure(settings_: tuple) -> None:
+    """
+    Включение замеров в процессе пула по настройкам основного процесса (см. settings)
+    """
+    global enabled, tracing
+    enabled, tracing = settings_
+
+
+def start(trace: bool = False) -> None:
+    configure((True, trace))
+    _own()
+    _stats.clear()
+    _events.clear()
+
+
+def collect() -> dict:
+    """
+    Замеры процесса с момента прошлого вызова (для передачи в основной процесс) или None
+    """
+    if not enabled:
+        return None
+    _own()
+    snapshot = dict(stats={name: list(s) for name, s in _stats.items()}, events=list(_events))
+    _stats.clear()
+    _events.clear()
+    return snapshot
+
+
+def merge(snapshot: dict) -> None:
+    if not snapshot:
+        return
+    for name, s in snapshot['stats'].items():
+        add(name, *s)
+    _events.extend(snapshot['events'])
+
+
+def stop(trace: str = None) -> dict:
+    """
+    Выключение замеров
+
+    :param trace: файл JSON для событий в формате Chrome trace
+    :return: {этап: {'count', 'wall', 'cpu', 'bytes'}} - суммы по всем процессам (время - в секундах)
+    """
+    report = {name: dict(count=s[0], wall=s[1], cpu=s[2], bytes=s[3]) for name, s in sorted(_stats.items())}
+    if trace is not None:
+        with open(trace, 'w') as file:
+            json.dump(dict(traceEvents=_events, displayTimeUnit='ms'), file)
+    configure((False, False))
+    _stats.clear()
+    _events.clear()
+    return report
@@ -0,0 +1,122 @@
+#  -*- coding: utf-8 -*-
+import copy
+from typing import Mapping
+import numpy as np
+from core import Initialize, Channel, Progress
+from integration import Integration, at
+from archive import Archive
+
+"""
+Временной ряд спектров яркостной температуры по последовательным сеансам радиозондирования
+
+Сеансы обходятся по возрастанию ключа (year, month, day, label). Соседние сеансы часто отличаются
+только выше некоторой высоты или только влажностью, поэтому каждый профиль сравнивается с предыдущим:
+погонный коэффициент поглощения пересчитывается только на изменившихся уровнях, накопленная
+оптическая толщина и подынтегральная функция - только от первого изменившегося уровня вверх
+(ниже него они не зависят от верхних уровней). Если изменилась сетка высот (число уровней или
+высоты), сеанс считается полностью.
+"""
+
+
+class State:
+    def __init__(self, core: Initialize, frequencies: np.ndarray):
+        """
+        Расчет сеанса целиком
+
+        :param core: профиль и настройки расчета
+        :param frequencies: частоты в ГГц
+        """
+        self.core, self.frequencies = core, frequencies
+        # профиль, по которому посчитан коэффициент поглощения (при atol > 0 может отличаться от core)
+        self.reference = [np.array(core.T), np.array(core.P), np.array(core.rho)]
+        self.absorption = core.absorption(frequencies)
+        self.tau = Integration.cumulative(method=core.integration_method, a=core.sec * self.absorption, dh=core.dh)
+        self.a = self.integrand(0)
+
+    def integrand(self, start: int) -> np.ndarray:
+        # T * g * exp(-tau) для уровней start и выше
+        core = self.core
+        return (core.T[start:] + 273.15) * core.sec * self.absorption[:, start:] * np.exp(-1 * self.tau[:, start:])
+
+    def changed(self, core: Initialize, atol: float = 0.) -> np.ndarray:
+        """
+        :return: номера уровней core, отличающихся от текущего профиля, или None, если сетки высот разные
+        """
+        if len(core.alt) != len(self.core.alt) or np.any(core.alt != self.core.alt) or \
+                core.h_start != self.core.h_start:
+            return None
+        diff = [np.abs(a - b) > atol for a, b in zip([core.T, core.P, core.rho], self.reference)]
+        return np.flatnonzero(diff[0] | diff[1] | diff[2])
+
+    def update(self, core: Initialize, levels: np.ndarray) -> None:
+        """
+        Переход к профилю core, отличающемуся от текущего только на уровнях levels
+        """
+        self.core = core
+        if not len(levels):
+            return
+        for a, b in zip(self.reference, [core.T, core.P, core.rho]):
+            a[levels] = b[levels]
+        subset = copy.copy(core)
+        subset.T, subset.P, subset.rho = core.T[levels], core.P[levels], core.rho[levels]
+        # отдельные уровни не сохраняются в кэше
+        subset.use_cache = False
+        self.absorption[:, levels] = subset.absorption(self.frequencies)
+
+        start = levels[0]
+        self.tau[:, start:] = Integration.cumulative(method=core.integration_method, a=core.sec * self.absorption,
+                                                     dh=core.dh, start=start)
+        self.a[:, start:] = self.integrand(start)
+
+    def brightness(self) -> np.ndarray:
+        """
+        :return: яркостная температура нисходящего излучения (n_freq,)
+        """
+        inf = len(self.core.T) - 1
+        brt = Integration.integrate(method=self.core.integration_method, a=self.a, lower=0, upper=inf,
+                                    dh=self.core.dh)
+        if self.core.relic_background:
+            brt = brt + 2.72548 * np.exp(-1 * at(self.tau, inf))
+        return brt
+
+
+def spectra(data: Mapping, first: tuple = None, last: tuple = None, atol: float = 0.,
+            channel: Channel = None, **config) -> tuple:
+    """
+    Временной ряд спектров яркостной температуры нисходящего излучения
+
+    :param data: база сеансов {(year, month, day, label): (T, P, rho_rel, alt)} - Archive или dict
+    :param first: первый ключ диапазона (по умолчанию - с начала базы)
+    :param last: последний ключ диапазона включительно (по умолчанию - до конца базы)
+    :param atol: наибольшее различие T, P, rho, при котором уровень считается неизменившимся
+        (0 - любое изменение)
+    :param channel: канал для передачи прогресса (см. core.Channel)
+    :param config: настройки Initialize (модели, метод интегрирования, высоты, частоты, угол...)
+    :return: keys (n_sessions, 4), frequencies (n_freq,), tb (n_sessions, n_freq),
+        levels (n_sessions,) - число уровней, на которых пересчитывался коэффициент поглощения;
+        для сеансов без уровней в заданном слое - nan и 0
+    """
+    keys = [key for key in sorted(tuple(key) for key in data.keys())
+            if (first is None or key >= tuple(first)) and (last is None or key <= tuple(last))]
+    frequencies = Initialize(**config).frequencies
+
+    tb = np.full((len(keys), len(frequencies)), np.nan)
+    levels = np.zeros(len(keys), dtype=int)
+    progress = Progress(total=len(keys), channel=channel)
+    state = None
+    for i, key in enumerate(keys):
+        core = Initialize(**config, **dict(zip(Archive.variables, data[key])))
+        if len(core.T):
+            changed = None if state is None else state.changed(core, atol)
+            if changed is None:
+                state = State(core, frequencies)
+                levels[i] = len(core.T)
+            else:
+                state.update(core, changed)
+                levels[i] = len(changed)
+            tb[i] = state.brightness()
+        progress.update()
+    progress.close()
+    if channel is not None:
+        channel.put('progress', 100)
+    return np.asarray(keys, dtype=int).reshape(-1, 4), frequencies, tb, levels
@@ -0,0 +1,68 @@
+#  -*- coding: utf-8 -*-
+import numpy as np
+import pytest
+from attenuation import Oxygen, WaterVapor
+from integration import Integration, at
+from core import Initialize
+
+"""
+Накопленный интеграл (Integration.cumulative) совпадает с квадратичным расчетом по уровням
+
+    python -m pytest -q test_integration.py
+"""
+
+methods = [m.value for m in Integration.Methods]
+
+
+def standard_atmosphere(n_levels: int, h_stop: float = 15.) -> dict:
+    # синтетический профиль стандартной атмосферы
+    alt = np.linspace(0., h_stop, n_levels)
+    return dict(T=np.where(alt < 11., 15. - 6.5 * alt, -56.5), P=1013.25 * np.exp(-alt / 7.7),
+                rho_rel=np.clip(80. - 5. * alt, 5., 100.), alt=alt, h_start=0., h_stop=h_stop)
+
+
+@pytest.mark.parametrize('method', methods)
+@pytest.mark.parametrize('n_levels', [1, 2, 3, 4, 5, 8, 9, 17, 64])
+@pytest.mark.parametrize('shape', [(), (3, 2)])
+def test_cumulative(method: str, n_levels: int, shape: tuple):
+    rng = np.random.default_rng(n_levels)
+    a = rng.uniform(0., 2., shape + (n_levels,))
+    dh = rng.uniform(0.01, 0.5, shape + (n_levels,))
+    expected = np.stack([Integration.integrate(method, a, 0, h, dh) for h in range(n_levels)], axis=-1)
+    np.testing.assert_allclose(Integration.cumulative(method, a, dh), expected, rtol=1e-12, atol=1e-12)
+
+
+@pytest.mark.parametrize('method', methods)
+def test_cumulative_start(method: str):
+    rng = np.random.default_rng(0)
+    a, dh = rng.uniform(0., 2., (4, 33)), rng.uniform(0.01, 0.5, 33)
+    full = Integration.cumulative(method, a, dh)
+    for start in range(33):
+        np.testing.assert_allclose(Integration.cumulative(method, a, dh, start), full[..., start:],
+                                   rtol=1e-12, atol=1e-12)
+
+
+def quadratic(core: Initialize, nu: float) -> float:
+    # расчет до перехода на накопленный интеграл: оптическая толщина заново для каждого уровня
+    g = core.sec * (Oxygen.gamma(model=core.oxygen_model, frequency=nu, T=core.T, P=core.P, rho=core.rho) +
+                    WaterVapor.gamma(model=core.water_vapor_model, frequency=nu, T=core.T, P=core.P, rho=core.rho))
+    T = core.T + 273.15
+
+    def f(h):
+        integral = Integration.integrate(method=core.integration_method, a=g, lower=0, upper=h, dh=core.dh)
+        return at(T, h) * at(g, h) * np.exp(-1 * integral)
+
+    inf = len(g) - 1
+    brt = Integration.integrate_callable(method=core.integration_method, f=f, lower=0, upper=inf, dh=core.dh)
+    tau = Integration.integrate(method=core.integration_method, a=g, lower=0, upper=inf, dh=core.dh)
+    return brt + 2.72548 * np.exp(-1 * tau)
+
+
+@pytest.mark.parametrize('method', methods)
+@pytest.mark.parametrize('n_levels', [7, 40])
+def test_bt_downwelling(method: str, n_levels: int):
+    core = Initialize(oxygen_model=Oxygen.Models.P676_13.value, water_vapor_model=WaterVapor.Models.P676_13.value,
+                      integration_method=method, nu_start=18., nu_stop=19., nu_step=1., theta=30.,
+                      use_cache=False, **standard_atmosphere(n_levels))
+    for nu in [18., 22.235, 55., 60., 118.75]:
+        assert core.bt_downwelling(nu)[1] == pytest.approx(quadratic(core, nu), rel=1e-12, abs=1e-9)
@@ -1,5 +1,5 @@
 #  -*- coding: utf-8 -*-
-from typing import Union
+from typing import Union, Callable, Sequence
 import numpy as np
 
 """
@@ -30,7 +30,28 @@ def relative_humidity(T: Union[float, np.ndarray], P: Union[float, np.ndarray],
         ('wmo2008', 'august-roche-magnus', 'tetens', 'august', 'buck')
     :return: %
     """
-    return pressure(T, rho) / saturated.pressure(T, P, method) * 100
+    return pressure(T, rho) / saturated.pressure(T, P, saturated.method(method)) * 100
+
+
+def _bulk(f: Callable, T: Sequence[np.ndarray], P: Sequence[np.ndarray], x: Sequence[np.ndarray],
+          method: str) -> list:
+    lengths = [np.size(_) for _ in T]
+    T, P, x = [np.concatenate([np.ravel(_) for _ in a]) for a in [T, P, x]]
+    return np.split(f(T, P, x, saturated.method(method)), np.cumsum(lengths)[:-1])
+
+
+def relative_humidity_bulk(T: Sequence[np.ndarray], P: Sequence[np.ndarray],
+                           rho: Sequence[np.ndarray], method='wmo2008') -> list:
+    """
+    Расчет относительной влажности одним вызовом для набора профилей разной длины
+
+    :param T: профили температуры воздуха, град. Цельс.
+    :param P: профили барометрического давления, гПа
+    :param rho: профили абсолютной влажности, г/м^3
+    :param method: метод расчета давления насыщенного водяного пара
+    :return: список профилей, %
+    """
+    return _bulk(relative_humidity, T, P, rho, method)
 
 
 def absolute_humidity(T: Union[float, np.ndarray], P: Union[float, np.ndarray],
@@ -45,7 +66,22 @@ def absolute_humidity(T: Union[float, np.ndarray], P: Union[float, np.ndarray],
         ('wmo2008', 'august-roche-magnus', 'tetens', 'august', 'buck')
     :return: г/м^3
     """
-    return (rel / 100) * 216.7 * saturated.pressure(T, P, method) / (T + 273.15)
+    return (rel / 100) * 216.7 * saturated.pressure(T, P, saturated.method(method)) / (T + 273.15)
+
+
+def absolute_humidity_bulk(T: Sequence[np.ndarray], P: Sequence[np.ndarray],
+                           rel: Sequence[np.ndarray], method='wmo2008') -> list:
+    """
+    Расчет абсолютной влажности одним вызовом для набора профилей разной длины
+    (для профилей одинаковой длины достаточно absolute_humidity от массивов (n_sessions, n_levels))
+
+    :param T: профили температуры воздуха, град. Цельс.
+    :param P: профили барометрического давления, гПа
+    :param rel: профили относительной влажности, %
+    :param method: метод расчета давления насыщенного водяного пара
+    :return: список профилей, г/м^3
+    """
+    return _bulk(absolute_humidity, T, P, rel, method)
 
 
 class saturated:
@@ -53,31 +89,60 @@ class saturated:
     Насыщенный водяной пар
     """
 
+    @staticmethod
+    def wmo2008(T: Union[float, np.ndarray]) -> Union[float, np.ndarray]:
+        return 6.112 * np.exp(17.62 * T / (243.12 + T))
+
+    @staticmethod
+    def august_roche_magnus(T: Union[float, np.ndarray]) -> Union[float, np.ndarray]:
+        return 0.61094 * np.exp(17.625 * T / (243.04 + T)) * 10
+
+    @staticmethod
+    def tetens(T: Union[float, np.ndarray]) -> Union[float, np.ndarray]:
+        return 0.61078 * np.exp(17.27 * T / (T + 237.3)) * 10
+
+    @staticmethod
+    def august(T: Union[float, np.ndarray]) -> Union[float, np.ndarray]:
+        return np.exp(20.386 - 5132 / (T + 273.15)) * 1.333
+
+    @staticmethod
+    def buck(T: Union[float, np.ndarray]) -> Union[float, np.ndarray]:
+        return np.where(T > 0,
+                        6.1121 * np.exp((18.678 - T / 234.5) * (T / (257.14 + T))),
+                        6.1115 * np.exp((23.036 - T / 333.7) * (T / (279.82 + T))))[()]
+
+    @staticmethod
+    def method(name: Union[str, Callable]) -> Callable:
+        """
+        Функция аппроксимации по названию метода (неизвестное название - 'wmo2008')
+        """
+        if callable(name):
+            return name
+        return saturated.methods.get(name.lower(), saturated.wmo2008)
+
     @staticmethod
     def pressure(T: Union[float, np.ndarray], P: Union[float, np.ndarray] = None,
-                 method='wmo2008') -> Union[float, np.ndarray]:
+                 method: Union[str, Callable] = 'wmo2008') -> Union[float, np.ndarray]:
         """
         Давление насыщенного водяного пара во влажном воздухе
 
         :param T: температура воздуха, град. Цельс.
         :param P: барометрическое давление, гПа
         :param method: метод аппроксимации ('wmo2008', 'august-roche-magnus',
-            'tetens', 'august', 'buck')
+            'tetens', 'august', 'buck') или функция, возвращенная saturated.method
         :return: давление в гПа
         """
-        if method.lower() == 'august-roche-magnus':
-            e = 0.61094 * np.exp(17.625 * T / (243.04 + T)) * 10
-        elif method.lower() == 'tetens':
-            e = 0.61078 * np.exp(17.27 * T / (T + 237.3)) * 10
-        elif method.lower() == 'august':
-            e = np.exp(20.386 - 5132 / (T + 273.15)) * 1.333
-        elif method.lower() == 'buck':
-            if T > 0:
-                e = 6.1121 * np.exp((18.678 - T / 234.5) * (T / (257.14 + T)))
-            else:
-                e = 6.1115 * np.exp((23.036 - T / 333.7) * (T / (279.82 + T)))
-        else:
-            e = 6.112 * np.exp(17.62 * T / (243.12 + T))
+        e = (method if callable(method) else saturated.method(method))(T)
         if P is None:
             return e
         return (1.0016 + 3.15 * 0.000001 * P - 0.074 / P) * e
+
+
+# таблица методов аппроксимации: название -> функция (см. saturated.method)
+saturated.methods = {
+    'wmo2008': saturated.wmo2008,
+    'august-roche-magnus': saturated.august_roche_magnus,
+    'tetens': saturated.tetens,
+    'august': saturated.august,
+    'buck': saturated.buck,
+}